@@ -5,5 +5,6 @@
 """
 
 from .navbar import navbar # 匯出 navbar 元件
+from .pagination import pagination_bar # 匯出分頁列元件
 
-__all__ = ["navbar"] # 定義 `from .components import *` 時會匯出的內容
+__all__ = ["navbar", "pagination_bar"] # 定義 `from .components import *` 時會匯出的內容
@@ -2,55 +2,98 @@
 
 此模組定義了應用程式的通用導覽列。
 導覽列的內容會根據目前登入使用者的角色動態調整。
+
+`navbar` 與 `nav_link` 皆以 `rx.memo` 包裝，Reflex 編譯時只會產生一份共用的
+React 元件定義，各頁面僅引用該元件，不會重複展開整棵導覽列子樹。
 """
 import reflex as rx
-from typing import List
-from retake_apply.states.auth import AuthState # 假設 AuthState 在 retake_apply.states.auth 中
-from retake_apply.models.users import UserGroup # 假設 UserGroup 在 retake_apply.models.users 中
+from ..states.auth import AuthState # 與套件內其他模組一致使用相對匯入
+
+# `nav_link` 的靜態樣式屬性，於模組載入時建立一次。
+_NAV_LINK_PROPS = {
+    "color_scheme": "gray", # Radix Theme color scheme
+    "padding_x": "1em",
+    "padding_y": "0.5em",
+    "_hover": {"background_color": "var(--accent-3)"}, # Radix Theme accent color
+}
+
+@rx.memo
+def nav_link(text: rx.Var[str], href: rx.Var[str]) -> rx.Component:
+    """一個輔助函式，用於創建導覽列中的連結。
+
+    由於以 `rx.memo` 包裝，呼叫時必須以關鍵字參數傳入 `text` 與 `href`。
 
-def nav_link(text: str, href: str) -> rx.Component:
-    """一個輔助函式，用於創建導覽列中的連結。"""
+    Args:
+        text (rx.Var[str]): 連結顯示文字。
+        href (rx.Var[str]): 連結目標路徑。
+
+    Returns:
+        rx.Component: 導覽列連結元件。
+    """
     return rx.link(
         rx.text(text, size="4"), # Radix Theme Text size "4" is medium-large
         href=href,
-        color_scheme="gray", # Radix Theme color scheme
-        padding_x="1em",
-        padding_y="0.5em",
-        _hover={"background_color": "var(--accent-3)"} # Radix Theme accent color
+        **_NAV_LINK_PROPS,
     )
 
+# --- 靜態子樹常數 ---
+# 以下子樹不依賴任何狀態，於模組載入時建立一次，`navbar` 直接引用，避免重複建構元件物件。
+_BRAND_LINK = rx.link(
+    rx.hstack(
+        rx.image(src="/retake_apply_sys_icon_rmbg.png", height="2.5em", width="auto", alt="App Logo"),
+        rx.heading("校園重補修課程登記系統", size="6", margin_left="0.5em"), # Radix Theme Heading size "6" is large
+        align="center",
+        spacing="3" # Radix Theme spacing
+    ),
+    href="/", # 連結到首頁
+    style={"text_decoration": "none", "color": "inherit"}
+)
+
+# 導覽列中固定的 (文字, 路徑) 連結；僅建立一次 `nav_link` 實例。
+_DASHBOARD_NAV_LINK = nav_link(text="儀表板", href="/dashboard")
+_COURSE_SELECTION_NAV_LINK = nav_link(text="課程查詢與選課", href="/course-selection")
+
+_COURSE_MANAGER_MENU = rx.menu.content(
+    rx.menu.item("學年度與登記時間設定", on_click=rx.redirect("/manager/academic-year")),
+    rx.menu.item("重補修課程管理", on_click=rx.redirect("/manager/courses")),
+    rx.menu.item("學生應重補修名單管理", on_click=rx.redirect("/manager/students")),
+    rx.menu.item("學生報名資料管理", on_click=rx.redirect("/manager/enrollments")),
+    # rx.menu.separator(),
+    # rx.menu.item("TODO: 繳費相關管理"),
+    size="2" # Radix Theme menu content size
+)
+
+_SYSTEM_ADMIN_MENU = rx.menu.content(
+    rx.menu.item("使用者角色管理", on_click=rx.redirect("/admin/users")),
+    rx.menu.item("系統日誌查閱", on_click=rx.redirect("/admin/logs")),
+    size="2"
+)
+
+@rx.memo
 def navbar() -> rx.Component:
     """應用程式的導覽列元件。
 
     根據登入使用者的角色顯示不同的導覽選項。
+    此元件經 `rx.memo` 記憶化，所有頁面共用同一份編譯後的元件定義。
     """
     return rx.box(
         rx.hstack(
-            rx.link(
-                rx.hstack(
-                    rx.image(src="/retake_apply_sys_icon_rmbg.png", height="2.5em", width="auto", alt="App Logo"),
-                    rx.heading("校園重補修課程登記系統", size="6", margin_left="0.5em"), # Radix Theme Heading size "6" is large
-                    align="center",
-                    spacing="3" # Radix Theme spacing
-                ),
-                href="/", # 連結到首頁
-                style={"text_decoration": "none", "color": "inherit"}
-            ),
+            _BRAND_LINK,
             rx.spacer(), # 將左側標題與右側連結隔開
 
             # 通用連結 (所有已登入使用者可見)
             rx.cond(
                 AuthState.is_hydrated & AuthState.token_is_valid, # 確保已水合且已登入
                 rx.hstack(
-                    nav_link("儀表板", "/dashboard"),
+                    _DASHBOARD_NAV_LINK,
                     # 學生特定連結
                     rx.cond(
-                        AuthState.current_user_groups.contains(UserGroup.STUDENT), # type: ignore
-                        nav_link("課程查詢與選課", "/course-selection")
+                        AuthState.is_student, # type: ignore
+                        _COURSE_SELECTION_NAV_LINK
                     ),
                     # 課程管理者特定連結
                     rx.cond(
-                        AuthState.current_user_groups.contains(UserGroup.COURSE_MANAGER), # type: ignore
+                        AuthState.is_course_manager, # type: ignore
                         rx.menu.root(
                             rx.menu.trigger(
                                 rx.button(
@@ -60,20 +103,12 @@ def navbar() -> rx.Component:
                                     size="3" # Radix Theme button size
                                 )
                             ),
-                            rx.menu.content(
-                                rx.menu.item("學年度與登記時間設定", on_click=rx.redirect("/manager/academic-year")),
-                                rx.menu.item("重補修課程管理", on_click=rx.redirect("/manager/courses")),
-                                rx.menu.item("學生應重補修名單管理", on_click=rx.redirect("/manager/students")),
-                                rx.menu.item("學生報名資料管理", on_click=rx.redirect("/manager/enrollments")),
-                                # rx.menu.separator(),
-                                # rx.menu.item("TODO: 繳費相關管理"),
-                                size="2" # Radix Theme menu content size
-                            ),
+                            _COURSE_MANAGER_MENU,
                         )
                     ),
                     # 系統管理者特定連結
                     rx.cond(
-                        AuthState.current_user_groups.contains(UserGroup.SYSTEM_ADMIN), # type: ignore
+                        AuthState.is_system_admin, # type: ignore
                         rx.menu.root(
                             rx.menu.trigger(
                                 rx.button(
@@ -83,11 +118,7 @@ def navbar() -> rx.Component:
                                     size="3"
                                 )
                             ),
-                            rx.menu.content(
-                                rx.menu.item("使用者角色管理", on_click=rx.redirect("/admin/users")),
-                                rx.menu.item("系統日誌查閱", on_click=rx.redirect("/admin/logs")),
-                                size="2"
-                            ),
+                            _SYSTEM_ADMIN_MENU,
                         )
                     ),
                     rx.button(
@@ -0,0 +1,43 @@
+"""分頁控制 (上一頁 / 下一頁) 元件。
+
+此模組定義了列表頁面共用的分頁列，搭配混入 `KeysetPaginationMixin` 的狀態類別使用。
+"""
+import reflex as rx
+from typing import Optional, Type, Union
+from ..states.pagination_state import KeysetPaginationMixin # 提供 page、has_next_page 與翻頁事件
+
+def pagination_bar(
+    state: Type[KeysetPaginationMixin],
+    label: Optional[Union[str, rx.Var[str]]] = None,
+) -> rx.Component:
+    """建立「上一頁 / 頁碼 / 下一頁」分頁列。
+
+    Args:
+        state (Type[KeysetPaginationMixin]): 混入 `KeysetPaginationMixin` 的狀態類別。
+        label (Optional[Union[str, rx.Var[str]]]): 兩個按鈕之間的文字；未提供時顯示「第 N 頁」。
+
+    Returns:
+        rx.Component: 分頁列元件。
+    """
+    return rx.hstack(
+        rx.button(
+            "上一頁",
+            on_click=state.prev_page, # type: ignore
+            disabled=state.page == 0,
+            variant="soft",
+            size="2",
+        ),
+        rx.text(label if label is not None else f"第 {state.page + 1} 頁"),
+        rx.button(
+            "下一頁",
+            on_click=state.next_page, # type: ignore
+            disabled=~state.has_next_page,
+            variant="soft",
+            size="2",
+        ),
+        spacing="3",
+        align="center",
+        justify="center",
+        width="100%",
+        margin_top="1em",
+    )
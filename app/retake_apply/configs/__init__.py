@@ -1,8 +1,11 @@
 """應用程式組態設定模組。
 
 此模組使用 `pydantic-settings` 函式庫定義用於從環境變數載入
-應用程式所需組態的類別。
+應用程式所需組態的類別，並提供快取的單例存取函式 (例如 `get_db_env()`)，
+避免每次取用設定時都重新讀取環境變數並執行 Pydantic 驗證。
 """
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -44,3 +47,16 @@ class DbEnv(EnvSetting):
     password: str
     authSource: str = "admin"  # 驗證資料庫
     db_name: str # 應用程式使用的資料庫名稱
+
+
+@lru_cache(maxsize=1)
+def get_db_env() -> DbEnv:
+    """取得快取的 MongoDB 連線設定。
+
+    首次呼叫時建立 `DbEnv` 實例，之後皆回傳同一物件。
+    若缺少必要的環境變數，會在首次呼叫時拋出 `pydantic.ValidationError`。
+
+    Returns:
+        DbEnv: MongoDB 資料庫連線相關的環境變數設定。
+    """
+    return DbEnv()
@@ -11,7 +11,19 @@ from .academic_year_setting import AcademicYearSetting
 from .system_log import SystemLog, LogLevel
 from .payment import Payment, PaymentRecordStatus # 匯入 Payment 和 PaymentRecordStatus
 
+# 需向 Beanie 註冊的 Document 模型；每個模型只在此列出一次，`init_beanie` 直接使用此清單。
+DOCUMENT_MODELS = (
+    User,
+    Course,
+    Enrollment,
+    RequiredCourse,
+    AcademicYearSetting,
+    SystemLog,
+    Payment,
+)
+
 __all__ = [
+    "DOCUMENT_MODELS",
     "User",
     "UserGroup",
     "Course",
@@ -1,13 +1,27 @@
+import time
 from datetime import datetime
-from typing import Optional
-from beanie import Document
-from pydantic import Field # Field 從 pydantic 匯入
+from typing import Optional, Tuple
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, Field, model_validator # Field 從 pydantic 匯入
 from pymongo import IndexModel # 匯入 IndexModel
-from ..utils.funcs import get_utc_now # 使用 UTC 時間以確保時區一致性
+from pymongo.errors import DuplicateKeyError # 唯一索引衝突
+from ..utils.funcs import format_datetime_to_taipei_str, get_utc_now # 使用 UTC 時間以確保時區一致性
 
 # 備註：原先若有 get_now 函式，現已統一使用 get_utc_now。
 # 若需手動設定時間，可考慮 Field(default_factory=datetime.utcnow)
 
+# `get_current()` 的行程內快取：(快取時間點 time.monotonic(), 設定物件)。
+# 當前學年度設定極少變動，但幾乎每個頁面都會查詢，故以 TTL 快取省去資料庫往返。
+# 同一行程內由 `set_current()` / `save()` 主動失效；多個 worker 之間則最多有 `_CACHE_TTL` 秒的延遲。
+# 查無作用中設定時不快取，以免 `set_current()` 切換期間的短暫空窗被保留整個 TTL。
+_CACHE_TTL = 60.0
+_current_cache: Tuple[float, Optional["AcademicYearSetting"]] = (0.0, None)
+
+def _invalidate_current_cache() -> None:
+    """清除 `AcademicYearSetting.get_current()` 的行程內快取。"""
+    global _current_cache
+    _current_cache = (0.0, None)
+
 class AcademicYearSetting(Document):
     """
     代表系統當前運作的學年度設定，用於確保選課與開課操作基於正確的學年度。
@@ -25,22 +39,42 @@ class AcademicYearSetting(Document):
         name = "academic_year_settings"  # 明確指定集合名稱
         indexes = [
             IndexModel([("academic_year", 1), ("is_active", 1)], name="academic_year_1_is_active_1"), # 方便查詢特定學年是否活躍
-            IndexModel([("is_active", 1), ("set_at", -1)], name="is_active_1_set_at_-1"), # 方便查詢最新活躍設定
+            # 部分索引：僅收錄 is_active 為 True 的文件 (通常僅一筆)，
+            # get_current() 的排序查詢可直接命中此索引。
+            IndexModel(
+                [("is_active", 1), ("set_at", -1)],
+                name="is_active_1_set_at_-1_active_only",
+                partialFilterExpression={"is_active": True},
+            ),
+            # 部分唯一索引：由資料庫保證最多只有一筆作用中設定。
+            # 既有資料庫若已有多筆作用中設定，須先執行 utils/migrations.py 的 dedupe 步驟，否則索引無法建立。
+            IndexModel(
+                [("is_active", 1)],
+                name="uniq_active",
+                unique=True,
+                partialFilterExpression={"is_active": True},
+            ),
         ]
 
     @classmethod
     async def get_current(cls) -> Optional["AcademicYearSetting"]:
         """獲取當前有效的學年度設定。
 
-        優先查找 `is_active` 為 `True` 且 `set_at` 最新的記錄。
+        查找 `is_active` 為 `True` 的記錄；部分唯一索引 `uniq_active` 保證至多一筆，
+        仍依 `set_at` 取最新者，以防索引建立前遺留的多筆作用中設定。
+        查詢結果會快取 `_CACHE_TTL` 秒，期間內的呼叫不會存取資料庫；查無結果時不快取。
 
         Returns:
             Optional["AcademicYearSetting"]: 當前有效的學年度設定物件，若無則為 `None`。
         """
-        current_setting = await cls.find_one(
-            cls.is_active == True,
-            sort=[("-set_at",)], # 確保取到最新的 active 設定
-        )
+        global _current_cache
+        cached_at, cached_setting = _current_cache
+        if cached_at and time.monotonic() - cached_at < _CACHE_TTL:
+            return cached_setting
+
+        current_setting = await cls.find(cls.is_active == True).sort(-cls.set_at).first_or_none()
+        if current_setting is not None:
+            _current_cache = (time.monotonic(), current_setting)
         return current_setting
 
     @classmethod
@@ -54,8 +88,14 @@ class AcademicYearSetting(Document):
         """
         設定新的學年度為當前作用中的學年度。
 
-        此操作會將先前所有 `is_active` 為 `True` 的設定更新為 `False`，
-        然後插入一筆新的 `is_active` 為 `True` 的學年度設定。
+        由於部署的 MongoDB 為單機模式 (非 replica set)，無法使用多文件交易，故分步進行：
+        1. 插入一筆 `is_active` 為 `False` 的新設定。
+        2. 以條件式更新 (compare-and-set) 停用讀取到的前一筆作用中設定。
+        3. 將新設定改為作用中；部分唯一索引 `uniq_active` 保證至多一筆作用中設定。
+
+        兩個管理者同時設定時，第 3 步較晚者會因違反唯一索引而失敗：失敗者刪除自己插入的
+        新設定，若此時已無作用中設定，則恢復先前的設定，最終必定恰有一筆作用中設定。
+        第 2、3 步之間會有極短暫的空窗查無作用中設定 (`get_current()` 不會快取此結果)。
 
         Args:
             academic_year (str): 新的學年度字串，例如 "113-1"。
@@ -65,26 +105,51 @@ class AcademicYearSetting(Document):
 
         Returns:
             AcademicYearSetting: 新建立並已設為作用中的學年度設定物件。
+
+        Raises:
+            pymongo.errors.DuplicateKeyError: 若同時有其他管理者的設定先一步生效。
         """
-        # 將所有現存的 is_active 設為 False
-        # 考量到 Beanie 的 Document.update() 主要針對單一實例，
-        # 且 find().update() 的行為可能依賴版本或特定配置，
-        # 直接使用 motor collection 的 update_many 是更明確且可靠的做法，
-        # 以確保所有符合條件的舊設定都被正確停用。
-        await cls.get_motor_collection().update_many(
-            filter={"is_active": True},
-            update={"$set": {"is_active": False, "updated_at": get_utc_now()}}
-        )
-        
+        now = get_utc_now()
+        collection = cls.get_motor_collection()
+        # 直接使用 motor collection 的條件式更新，以確保只停用讀取到的那一筆設定。
+        previous = await collection.find_one({"is_active": True}, {"_id": 1}, sort=[("set_at", -1)])
+
         new_setting = cls(
             academic_year=academic_year,
             registration_start_time=registration_start,
             registration_end_time=registration_end,
             set_by_user_email=user_email,
-            set_at=get_utc_now(), # 確保使用 UTC 時間
-            is_active=True
+            set_at=now, # 確保使用 UTC 時間
+            is_active=False # 先以停用狀態插入，啟用前不會與現有設定衝突
         )
         await new_setting.insert()
+
+        deactivated_previous = False
+        if previous is not None:
+            result = await collection.update_one(
+                {"_id": previous["_id"], "is_active": True},
+                {"$set": {"is_active": False, "updated_at": now}},
+            )
+            deactivated_previous = result.modified_count == 1
+
+        try:
+            await collection.update_one({"_id": new_setting.id}, {"$set": {"is_active": True}})
+        except DuplicateKeyError:
+            # 其他管理者的設定已先生效：撤回本次插入，必要時恢復先前的設定
+            await collection.delete_one({"_id": new_setting.id})
+            if deactivated_previous and await collection.count_documents({"is_active": True}, limit=1) == 0:
+                try:
+                    await collection.update_one(
+                        {"_id": previous["_id"]},
+                        {"$set": {"is_active": True, "updated_at": get_utc_now()}},
+                    )
+                except DuplicateKeyError:
+                    pass # 其間已有其他設定生效
+            _invalidate_current_cache()
+            raise
+
+        new_setting.is_active = True
+        _invalidate_current_cache() # 設定已變更，使快取失效
         return new_setting
 
     async def save(self, **kwargs):
@@ -97,3 +162,31 @@ class AcademicYearSetting(Document):
         """
         self.updated_at = get_utc_now()
         await super().save(**kwargs)
+        _invalidate_current_cache() # 設定可能已變更，使快取失效
+
+
+class AcademicYearRow(BaseModel):
+    """學年度設定歷史表格用的投影模型，時間欄位於建立時一次格式化為台北時間字串。
+
+    原始的 `datetime` 欄位僅供格式化使用 (`exclude=True`)，不會傳至前端。
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    academic_year: str
+    registration_start_time: Optional[datetime] = Field(default=None, exclude=True)
+    registration_end_time: Optional[datetime] = Field(default=None, exclude=True)
+    set_by_user_email: Optional[str] = Field(default=None, exclude=True)
+    set_at: Optional[datetime] = Field(default=None, exclude=True)
+    is_active: bool = False
+    registration_start_display: str = ""
+    registration_end_display: str = ""
+    set_by_display: str = ""
+    set_at_display: str = ""
+
+    @model_validator(mode="after")
+    def _build_display_fields(self) -> "AcademicYearRow":
+        """依原始欄位組出表格顯示用的字串；未設定的時間以 "未設定" 或 "N/A" 表示。"""
+        self.registration_start_display = format_datetime_to_taipei_str(self.registration_start_time, "%Y-%m-%d %H:%M") if self.registration_start_time else "未設定"
+        self.registration_end_display = format_datetime_to_taipei_str(self.registration_end_time, "%Y-%m-%d %H:%M") if self.registration_end_time else "未設定"
+        self.set_by_display = self.set_by_user_email or "N/A"
+        self.set_at_display = format_datetime_to_taipei_str(self.set_at, "%Y-%m-%d %H:%M:%S") if self.set_at else "N/A"
+        return self
@@ -1,15 +1,40 @@
+import re
 from datetime import datetime
 from typing import List, Optional, Annotated
-from beanie import Document, Indexed # Link 不再直接使用於此模型
-from pydantic import Field, BaseModel, field_validator, computed_field # Pydantic v2 匯入
+from beanie import Document, Indexed, PydanticObjectId # Link 不再直接使用於此模型
+from pydantic import ConfigDict, Field, BaseModel, PrivateAttr, field_validator, computed_field, model_validator # Pydantic v2 匯入
 from pymongo import IndexModel # 匯入 IndexModel
 from ..utils.funcs import get_utc_now # 使用 UTC 時間以確保時區一致性
 
 # VALID_PERIODS 常數定義：定義了系統中所有有效的課程節次代號。
+# 保持有序，供下拉選單與預設值 (VALID_PERIODS[0]) 使用；驗證時改用下方的 frozenset。
 VALID_PERIODS = [f"D{i}" for i in range(1, 10)] + ["DN"]
+_VALID_PERIOD_SET: frozenset[str] = frozenset(VALID_PERIODS) # 供 O(1) 節次驗證
+
+# HH:MM 時間格式的預編譯正規表示式。
+# 與先前 datetime.strptime(value, "%H:%M") 的接受範圍相同：時、分皆允許省略前導零 (例如 "8:00")。
+_TIME_RE = re.compile(r"([01]?\d|2[0-3]):[0-5]?\d")
+
+def _hhmm_to_minutes(value: str) -> int:
+    """將 HH:MM 格式的時間字串換算為當天的分鐘數。
+
+    Args:
+        value (str): 已通過格式驗證的 HH:MM 時間字串。
+
+    Returns:
+        int: 自當天 00:00 起算的分鐘數。
+    """
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
 
 class CourseTimeSlot(BaseModel):
-    """課程上課時間插槽的內嵌 Pydantic 模型。"""
+    """課程上課時間插槽的內嵌 Pydantic 模型。
+
+    設為不可變 (frozen)：分鐘數快取於初始化時計算，欄位若可被修改，快取會與欄位不一致。
+    需要變更時段時請建立新的 `CourseTimeSlot`。
+    """
+    model_config = ConfigDict(frozen=True)
+
     week_number: Optional[int] = None  # 週次，若適用
     day_of_week: int = Field(..., ge=1, le=7)  # 星期幾，1=週一, ..., 7=週日
     period: str  # 節次，例如 "D1", "DN", "D5"
@@ -17,6 +42,11 @@ class CourseTimeSlot(BaseModel):
     end_time: str  # 格式 HH:MM
     location: Optional[str] = None  # 上課地點
 
+    # 開始/結束時間換算成當天分鐘數的快取，於模型初始化時計算一次，不會寫入資料庫。
+    # 模型為 frozen，欄位無法於初始化後修改，故快取不會與 start_time / end_time 不一致。
+    _start_minutes: int = PrivateAttr(default=0)
+    _end_minutes: int = PrivateAttr(default=0)
+
     @field_validator('period')
     @classmethod
     def validate_period(cls, value: str) -> str:
@@ -31,7 +61,7 @@ class CourseTimeSlot(BaseModel):
         Raises:
             ValueError: 若節次代號無效。
         """
-        if value not in VALID_PERIODS:
+        if value not in _VALID_PERIOD_SET:
             raise ValueError(f"無效的節次代號: {value}。有效代號為: {VALID_PERIODS}")
         return value
 
@@ -49,12 +79,39 @@ class CourseTimeSlot(BaseModel):
         Raises:
             ValueError: 若時間格式不正確。
         """
-        try:
-            datetime.strptime(value, "%H:%M")
-        except ValueError:
+        if not _TIME_RE.fullmatch(value):
             raise ValueError(f"時間格式應為 HH:MM，但收到: {value}")
         return value
     
+    def model_post_init(self, __context) -> None:
+        """Pydantic 初始化後鉤子：將 `start_time` / `end_time` 預先換算為分鐘數。
+
+        時間格式已由 `validate_time_format` 驗證，此處可直接解析。
+        私有屬性不受 frozen 限制，可於此寫入。
+        """
+        self._start_minutes = _hhmm_to_minutes(self.start_time)
+        self._end_minutes = _hhmm_to_minutes(self.end_time)
+
+    @property
+    def start_minutes(self) -> int:
+        """開始時間換算成當天的分鐘數。"""
+        return self._start_minutes
+
+    @property
+    def end_minutes(self) -> int:
+        """結束時間換算成當天的分鐘數。"""
+        return self._end_minutes
+
+    @property
+    def display_text(self) -> str:
+        """課程卡片上顯示的時段文字，例如 "星期1 D1 (08:10-09:00) @A101 (W3)"。"""
+        text = f"星期{self.day_of_week} {self.period} ({self.start_time}-{self.end_time})"
+        if self.location:
+            text += f" @{self.location}"
+        if self.week_number:
+            text += f" (W{self.week_number})"
+        return text
+
     def overlaps_with(self, other_slot: "CourseTimeSlot") -> bool:
         """檢查此時間插槽是否與另一個時間插槽重疊。
 
@@ -84,26 +141,36 @@ class CourseTimeSlot(BaseModel):
         if self.period == other_slot.period:
             return True # 同一天、同一週(如果適用)、同一節次，必衝突
 
-        # 檢查實際時間是否有重疊
-        try:
-            # 將 HH:MM 時間轉換為當天的分鐘數以便比較
-            s1_minutes = int(self.start_time[:2]) * 60 + int(self.start_time[3:])
-            e1_minutes = int(self.end_time[:2]) * 60 + int(self.end_time[3:])
-            s2_minutes = int(other_slot.start_time[:2]) * 60 + int(other_slot.start_time[3:])
-            e2_minutes = int(other_slot.end_time[:2]) * 60 + int(other_slot.end_time[3:])
-        except ValueError:
-            # 理論上時間格式已由 Pydantic validator 驗證過。
-            # 若此處仍發生錯誤，可能代表資料未經 Pydantic 模型初始化。
-            # 為求穩健，將其視為不衝突，並建議記錄此異常。
-            # logging.error(f"時間轉換錯誤於衝堂檢查: self={self}, other={other_slot}")
-            return False 
-
         # 檢查時間區間是否重疊: max(start1, start2) < min(end1, end2)
-        if max(s1_minutes, s2_minutes) < min(e1_minutes, e2_minutes):
+        # 分鐘數已於模型初始化時換算並快取，此處不需再解析字串。
+        if max(self._start_minutes, other_slot._start_minutes) < min(self._end_minutes, other_slot._end_minutes):
             return True # 實際時間重疊
 
         return False
 
+    def first_overlap(self, slots: List["CourseTimeSlot"]) -> Optional["CourseTimeSlot"]:
+        """找出一組時間插槽中第一個與此時間插槽重疊的插槽。
+
+        判斷規則與 `overlaps_with` 相同，找到第一個重疊的插槽即停止比對；
+        回傳該插槽本身，呼叫端可直接用於組成衝堂訊息，不需再掃描一次。
+
+        Args:
+            slots (List[CourseTimeSlot]): 用於比較的時間插槽列表。
+
+        Returns:
+            Optional[CourseTimeSlot]: 第一個重疊（衝堂）的插槽；皆不重疊時為 `None`。
+        """
+        for slot in slots:
+            if self.overlaps_with(slot):
+                return slot
+        return None
+
+# 課程經編輯後以 $set 寫回的欄位；不含由 $inc 原子維護的 `enrolled_count`，避免覆寫並發的人數變動。
+COURSE_EDITABLE_FIELDS = frozenset({
+    "academic_year", "course_code", "course_name", "credits", "fee_per_credit",
+    "time_slots", "instructor_name", "max_students", "is_open_for_registration", "updated_at",
+})
+
 class Course(Document):
     """
     代表重補修課程的資料模型，包含課程基本資訊和上課時間。
@@ -117,6 +184,7 @@ class Course(Document):
     time_slots: List[CourseTimeSlot] = Field(default_factory=list)  # 上課時間列表
     instructor_name: Optional[str] = None  # 授課教師姓名
     max_students: Optional[int] = None  # 人數上限，初期可忽略
+    enrolled_count: int = Field(default=0)  # 目前有效選課人數；僅以 `reserve_seat` / `release_seat` 的原子 $inc 更新
     is_open_for_registration: bool = Field(default=True)  # 是否開放選課
     created_at: datetime = Field(default_factory=get_utc_now)  # 創建時間
     updated_at: Optional[datetime] = None  # 最後更新時間
@@ -141,6 +209,18 @@ class Course(Document):
         indexes = [
             # 確保在同一學年度 (academic_year) 下，科目代碼 (course_code) 是唯一的。
             IndexModel([("academic_year", 1), ("course_code", 1)], name="academic_year_1_course_code_1", unique=True),
+            # 多鍵 (multikey) 複合索引：可依學年度與上課星期/節次預先篩選可能衝堂的課程，
+            # 例如 {"academic_year": ..., "time_slots.day_of_week": {"$in": [...]}}。
+            IndexModel(
+                [("academic_year", 1), ("time_slots.day_of_week", 1), ("time_slots.period", 1)],
+                name="ay_ts_day_period",
+            ),
+            # 選課頁面的課程列表：以學年度、開放狀態等值篩選並依科目代碼排序，
+            # 搜尋關鍵字僅需在此索引範圍內 (當學年開放中的課程) 比對，且無需記憶體內排序。
+            IndexModel(
+                [("academic_year", 1), ("is_open_for_registration", 1), ("course_code", 1)],
+                name="ay_open_course_code",
+            ),
         ]
 
     async def save(self, **kwargs):
@@ -154,8 +234,81 @@ class Course(Document):
         self.updated_at = get_utc_now()
         await super().save(**kwargs)
 
+    @classmethod
+    async def reserve_seat(cls, course_id) -> bool:
+        """原子地為課程保留一個名額。
+
+        以單一 `find_one_and_update` 同時檢查人數上限並遞增 `enrolled_count`：
+        未設定 `max_students` 的課程不限人數；已額滿時條件不成立，不會寫入任何資料。
+        不需在應用程式端加鎖，熱門課程的並發選課也不會超收。
+
+        Args:
+            course_id: 課程的 ObjectId。
+
+        Returns:
+            bool: 若成功保留名額則回傳 `True`；若課程不存在或已額滿則回傳 `False`。
+        """
+        result = await cls.get_motor_collection().find_one_and_update(
+            {
+                "_id": course_id,
+                "$or": [
+                    {"max_students": None}, # 未設定人數上限 (null 或欄位不存在)
+                    {"$expr": {"$lt": [{"$ifNull": ["$enrolled_count", 0]}, "$max_students"]}},
+                ],
+            },
+            {"$inc": {"enrolled_count": 1}},
+            projection={"_id": 1},
+        )
+        return result is not None
+
+    @classmethod
+    async def release_seat(cls, course_id) -> None:
+        """原子地釋放一個先前以 `reserve_seat` 保留的名額。
+
+        Args:
+            course_id: 課程的 ObjectId。
+        """
+        await cls.get_motor_collection().update_one(
+            {"_id": course_id, "enrolled_count": {"$gt": 0}},
+            {"$inc": {"enrolled_count": -1}},
+        )
+
     # 備註：舊有的 calculate_total_fee 方法已被移除。
     # 目前 total_fee 欄位已改為使用 Pydantic 的 @computed_field 實現，
     # 這使得此衍生欄位的值能自動基於其他欄位計算，更為簡潔。
     # 若未來有需要在儲存前執行更複雜的欄位更新邏輯（非純粹衍生計算），
     # 可考慮使用 Beanie 的事件鉤子，例如 @before_event(Insert, Replace, SaveChanges)。
+
+
+class CourseCardView(BaseModel):
+    """選課頁面課程卡片用的投影模型，僅含卡片顯示所需欄位。
+
+    查詢時以此模型投影，不取回人數、開放狀態、建立/更新時間等卡片未使用的欄位。
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    academic_year: str
+    course_code: str
+    course_name: str
+    credits: float
+    fee_per_credit: int
+    # 自資料庫取回以組出 time_slots_display；不序列化，原始時段欄位不會送到前端。
+    time_slots: List[CourseTimeSlot] = Field(default_factory=list, exclude=True)
+    instructor_name: Optional[str] = None
+    time_slots_display: List[str] = Field(default_factory=list) # 各時段格式化後的顯示文字
+    # 以下欄位不在資料庫中，由選課頁面狀態依使用者的已選課程與登記狀態預先算好，
+    # 卡片直接讀取，不需在前端逐張比對已選課程列表。
+    is_enrolled: bool = False
+    button_text: str = ""
+    button_disabled: bool = True
+
+    @model_validator(mode="after")
+    def _build_time_slots_display(self) -> "CourseCardView":
+        """依 `time_slots` 組出 `time_slots_display`。"""
+        self.time_slots_display = [slot.display_text for slot in self.time_slots]
+        return self
+
+    @computed_field
+    @property
+    def total_fee(self) -> int:
+        """課程總費用，計算方式與 `Course.total_fee` 相同。"""
+        return int(self.credits * self.fee_per_credit)
@@ -1,12 +1,13 @@
+import asyncio
 from datetime import datetime
-from typing import Optional, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
 from enum import Enum
-from beanie import Document, Link
-from pydantic import Field
+from beanie import Document, Link, PydanticObjectId
+from pydantic import BaseModel, Field, TypeAdapter, model_validator
 from pymongo import IndexModel # 匯入 IndexModel
 from .users import User
 from .course import Course
-from ..utils.funcs import get_utc_now # 改用 get_utc_now
+from ..utils.funcs import format_datetime_to_taipei_str, get_utc_now # 改用 get_utc_now
 
 if TYPE_CHECKING:
     from .payment import Payment # 處理循環匯入
@@ -20,6 +21,25 @@ class EnrollmentStatus(str, Enum):
     CANCELLED_ADMIN = "管理員取消" # 例如，資格不符或課程取消
     # TODO: 根據實際需求，可能需要更多狀態，例如 "已額滿" (COURSE_FULL), "資格不符" (NOT_QUALIFIED) 等。
 
+# 視為「有效」的選課狀態 (已選上或待確認)，供衝堂檢查與「我的選課」等查詢共用。
+ACTIVE_ENROLLMENT_STATUSES = (
+    EnrollmentStatus.SUCCESS,
+    EnrollmentStatus.PENDING_CONFIRMATION,
+)
+
+# 視為「已取消」的選課狀態；此類記錄仍佔用 (user_id, course_id, academic_year) 唯一索引。
+CANCELLED_ENROLLMENT_STATUSES = frozenset({
+    EnrollmentStatus.CANCELLED_BY_STUDENT,
+    EnrollmentStatus.CANCELLED_CONFLICT,
+    EnrollmentStatus.CANCELLED_ADMIN,
+})
+
+class StatusChangeResult(str, Enum):
+    """`Enrollment.set_status` 的結果"""
+    CHANGED = "changed" # 狀態已變更 (名額計數已同步調整)
+    COURSE_FULL = "course_full" # 由取消改為有效時，課程已額滿
+    CONFLICT = "conflict" # 記錄不存在，或狀態已被其他請求變更
+
 class PaymentStatus(str, Enum):
     """繳費狀態列舉"""
     AWAITING_PAYMENT = "待繳費" # 等待學生繳費
@@ -39,7 +59,7 @@ class Enrollment(Document):
     academic_year: str  # 選課當下學年度，冗餘欄位，方便查詢，例如 "113-1"
     
     enrolled_at: datetime = Field(default_factory=get_utc_now)  # 登記時間
-    status: EnrollmentStatus = Field(default=EnrollmentStatus.SUCCESS)  # 選課狀態
+    status: EnrollmentStatus = Field(default=EnrollmentStatus.SUCCESS)  # 選課狀態；既有記錄只能經由 `set_status` 變更，以同步課程名額計數
     
     payment_status: PaymentStatus = Field(default=PaymentStatus.AWAITING_PAYMENT)  # 繳費狀態
     payment_record: Optional[Link["Payment"]] = None # 指向對應的繳費記錄 (Payment Document)
@@ -51,7 +71,15 @@ class Enrollment(Document):
         indexes = [
             IndexModel([("user_id", 1), ("course_id", 1), ("academic_year", 1)], name="unique_user_course_academic_year", unique=True),  # 確保同一學年學生不會重複選同一課程
             IndexModel([("academic_year", 1), ("status", 1)], name="academic_year_status_idx"), # 方便按學年和狀態查詢
-            IndexModel([("payment_status", 1)], name="payment_status_idx"), # 方便查詢繳費狀態
+            # 依 Equality-Sort-Range 排序的複合索引，對應「某學生本學期有效選課」查詢
+            # (Enrollment.user_id.id == ..., academic_year == ..., status in [...]，依 -enrolled_at 排序)。
+            # Link 欄位以 DBRef 儲存，查詢條件落在 user_id.$id，故索引鍵亦使用 user_id.$id。
+            # 唯一索引 unique_user_course_academic_year 僅負責資料完整性。
+            IndexModel(
+                [("user_id.$id", 1), ("academic_year", 1), ("status", 1), ("enrolled_at", -1)],
+                name="user_year_status_idx",
+            ),
+            IndexModel([("payment_status", 1)], name="payment_status_idx"), # 方便查詢繳費狀態 (不限使用者)
         ]
 
     async def save(self, **kwargs):
@@ -74,8 +102,196 @@ class Enrollment(Document):
         Returns:
             bool: 若選課記錄為有效狀態則回傳 `True`，否則回傳 `False`。
         """
-        return self.status not in [
-            EnrollmentStatus.CANCELLED_BY_STUDENT,
-            EnrollmentStatus.CANCELLED_CONFLICT,
-            EnrollmentStatus.CANCELLED_ADMIN,
-        ]
+        return self.status not in CANCELLED_ENROLLMENT_STATUSES
+
+    @classmethod
+    async def set_status(
+        cls,
+        enrollment_id,
+        new_status: EnrollmentStatus,
+        payment_status: Optional[PaymentStatus] = None,
+    ) -> StatusChangeResult:
+        """變更既有選課記錄的狀態，並同步調整課程的 `enrolled_count`。
+
+        所有既有記錄的狀態變更都應經由此方法，否則課程名額計數會與實際有效選課數不一致：
+        - 有效 → 取消：釋放一個名額。
+        - 取消 → 有效：先以 `Course.reserve_seat` 保留名額，課程額滿時不變更；並重設 `enrolled_at`。
+        - 其餘 (有效 ↔ 有效、取消 ↔ 取消)：不影響名額。
+
+        狀態以條件式原子更新 (compare-and-set) 寫入：僅當記錄仍為讀取時的狀態才會更新，
+        並發的重複請求中只有一個會成功，失敗者已保留的名額會釋放。
+
+        Args:
+            enrollment_id: 選課記錄的 ObjectId。
+            new_status (EnrollmentStatus): 新的選課狀態。
+            payment_status (Optional[PaymentStatus]): 若提供，一併更新繳費狀態。
+
+        Returns:
+            StatusChangeResult: 變更結果。
+        """
+        collection = cls.get_motor_collection()
+        current = await collection.find_one({"_id": enrollment_id}, {"status": 1, "course_id": 1})
+        if current is None:
+            return StatusChangeResult.CONFLICT
+        old_status = EnrollmentStatus(current["status"])
+        course_oid = current["course_id"].id # course_id 以 DBRef 儲存
+        was_active = old_status not in CANCELLED_ENROLLMENT_STATUSES
+        becomes_active = new_status not in CANCELLED_ENROLLMENT_STATUSES
+
+        if becomes_active and not was_active and not await Course.reserve_seat(course_oid):
+            return StatusChangeResult.COURSE_FULL
+
+        now = get_utc_now()
+        changes = {"status": new_status.value, "updated_at": now}
+        if payment_status is not None:
+            changes["payment_status"] = payment_status.value
+        if becomes_active and not was_active:
+            changes["enrolled_at"] = now # 重新啟用視為重新登記
+        result = await collection.update_one(
+            {"_id": enrollment_id, "status": old_status.value},
+            {"$set": changes},
+        )
+        if result.modified_count != 1:
+            if becomes_active and not was_active:
+                await Course.release_seat(course_oid)
+            return StatusChangeResult.CONFLICT
+
+        if was_active and not becomes_active:
+            await Course.release_seat(course_oid)
+        return StatusChangeResult.CHANGED
+
+async def fetch_enrolled_courses(enrollments: List[Enrollment]) -> List[Course]:
+    """取得一組選課記錄所對應的課程文件。
+
+    已透過 `fetch_links` 載入的 `course_id` 直接使用；尚未載入的 `Link` 則以
+    `asyncio.gather` 併發 fetch，使多筆查詢的網路往返重疊，而非逐筆依序等待。
+
+    Args:
+        enrollments (List[Enrollment]): 選課記錄列表。
+
+    Returns:
+        List[Course]: 對應的課程文件列表，順序與選課記錄相同；無法取得的課程會被略過。
+    """
+    course_refs = [enroll.course_id for enroll in enrollments if enroll.course_id]
+    unfetched = [ref for ref in course_refs if not isinstance(ref, Course)]
+    if not unfetched:
+        return course_refs # type: ignore[return-value] # 皆已是 Course 物件
+
+    fetched = iter(await asyncio.gather(*(ref.fetch() for ref in unfetched))) # type: ignore[union-attr]
+    courses: List[Course] = []
+    for ref in course_refs:
+        course = ref if isinstance(ref, Course) else next(fetched)
+        if course:
+            courses.append(course) # type: ignore[arg-type]
+    return courses
+
+
+class EnrollmentCourseRow(BaseModel):
+    """學生「我的選課」列表用的扁平資料列，已合併對應課程的代碼與名稱。
+
+    由 `fetch_enrollment_course_rows` 以單次 aggregation 產生，前端直接顯示，不需再解析 `Link`。
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    course_code: Optional[str] = None # 課程已被刪除時為 None
+    course_name: Optional[str] = None
+    status: EnrollmentStatus
+    payment_status: PaymentStatus
+    enrolled_at: datetime
+    enrolled_at_display: str = "" # 台北時間的登記時間字串，於建立時格式化一次
+
+    @model_validator(mode="after")
+    def _format_enrolled_at(self) -> "EnrollmentCourseRow":
+        """依 `enrolled_at` 組出 `enrolled_at_display`。"""
+        self.enrolled_at_display = format_datetime_to_taipei_str(self.enrolled_at, "%Y-%m-%d %H:%M")
+        return self
+
+class EnrollmentDetail(BaseModel):
+    """單筆選課的詳細資訊，僅在學生開啟「詳情」視窗時才載入並傳至前端。"""
+    id: str
+    academic_year: str
+    course_code: Optional[str] = None
+    course_name: Optional[str] = None
+    credits: Optional[float] = None
+    total_fee: Optional[int] = None # 學分數 × 每學分費用
+    instructor_name: Optional[str] = None
+    time_slots_display: List[str] = Field(default_factory=list)
+    status: EnrollmentStatus
+    payment_status: PaymentStatus
+    enrolled_at_display: str = ""
+    updated_at_display: str = ""
+
+    @classmethod
+    def from_documents(cls, enrollment: Enrollment, course: Optional[Course]) -> "EnrollmentDetail":
+        """由選課記錄與其課程文件組出詳細資訊；課程已被刪除時，課程相關欄位保留為 `None`。
+
+        Args:
+            enrollment (Enrollment): 選課記錄。
+            course (Optional[Course]): 對應的課程文件。
+
+        Returns:
+            EnrollmentDetail: 供詳情視窗顯示的資料。
+        """
+        detail = cls(
+            id=str(enrollment.id),
+            academic_year=enrollment.academic_year,
+            status=enrollment.status,
+            payment_status=enrollment.payment_status,
+            enrolled_at_display=format_datetime_to_taipei_str(enrollment.enrolled_at, "%Y-%m-%d %H:%M"),
+            updated_at_display=format_datetime_to_taipei_str(enrollment.updated_at, "%Y-%m-%d %H:%M") if enrollment.updated_at else "",
+        )
+        if course is not None:
+            detail.course_code = course.course_code
+            detail.course_name = course.course_name
+            detail.credits = course.credits
+            detail.total_fee = int(course.credits * course.fee_per_credit)
+            detail.instructor_name = course.instructor_name
+            detail.time_slots_display = [slot.display_text for slot in course.time_slots]
+        return detail
+
+# 模組層級建立一次的 TypeAdapter，批次驗證 aggregation 結果時重用已編譯的 schema。
+_ENROLLMENT_COURSE_ROW_LIST_ADAPTER = TypeAdapter(List[EnrollmentCourseRow])
+
+# `course_id` 以 DBRef 儲存；aggregation 的欄位路徑不能以 "$" 開頭的 `$id` 取值，需以 $getField 讀出 ObjectId。
+_COURSE_REF_ID_EXPR = {"$getField": {"field": {"$literal": "$id"}, "input": "$course_id"}}
+
+async def fetch_enrollment_course_rows(user_id: PydanticObjectId, academic_year: str) -> List[EnrollmentCourseRow]:
+    """取得學生在指定學年度的有效選課，並合併課程代碼與名稱。
+
+    以單次 aggregation 完成：先依 `user_year_status_idx` 篩選並排序選課記錄，
+    再以 `$lookup` 只取回對應課程的 `course_code` 與 `course_name`，
+    不需為每筆選課另外查詢課程，也不會取回完整的使用者與課程文件。
+
+    Args:
+        user_id (PydanticObjectId): 學生的使用者 ID。
+        academic_year (str): 學年度，例如 "113-1"。
+
+    Returns:
+        List[EnrollmentCourseRow]: 依登記時間新到舊排序的選課資料列。
+    """
+    pipeline = [
+        {"$match": {
+            "user_id.$id": user_id,
+            "academic_year": academic_year,
+            "status": {"$in": [status.value for status in ACTIVE_ENROLLMENT_STATUSES]},
+        }},
+        {"$sort": {"enrolled_at": -1}},
+        {"$lookup": {
+            "from": Course.get_motor_collection().name,
+            "let": {"course_oid": _COURSE_REF_ID_EXPR},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$course_oid"]}}},
+                {"$project": {"_id": 0, "course_code": 1, "course_name": 1}},
+            ],
+            "as": "course",
+        }},
+        {"$unwind": {"path": "$course", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "course_code": "$course.course_code",
+            "course_name": "$course.course_name",
+            "status": 1,
+            "payment_status": 1,
+            "enrolled_at": 1,
+        }},
+    ]
+    raw_rows = await Enrollment.get_motor_collection().aggregate(pipeline).to_list(None)
+    return _ENROLLMENT_COURSE_ROW_LIST_ADAPTER.validate_python(raw_rows)
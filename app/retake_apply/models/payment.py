@@ -1,10 +1,14 @@
+import asyncio
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 from enum import Enum
-from beanie import Document, Link, before_event, Insert
-from pydantic import Field
+from beanie import Document, Link, PydanticObjectId
+from beanie.operators import In, Set # MongoDB $in 查詢與 $set 更新操作符
+from bson import DBRef
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from pymongo import IndexModel # 匯入 IndexModel
 # 備註：Enrollment 模型中的 PaymentStatus 列舉用於表示選課記錄本身的繳費狀態。
+from .course import Course
 from ..utils.funcs import get_utc_now # 使用 UTC 時間以確保時區一致性
 
 if TYPE_CHECKING:
@@ -22,6 +26,27 @@ class PaymentRecordStatus(str, Enum):
     REFUND_PENDING = "待退款" # 等待退款處理
     REFUNDED = "已退款"      # 已完成退款
 
+class _CourseFeeView(BaseModel):
+    """計算課程費用所需欄位的投影模型，查詢時僅取回 `credits` 與 `fee_per_credit`。"""
+    id: PydanticObjectId = Field(alias="_id")
+    credits: float
+    fee_per_credit: int
+
+# 模組層級建立一次的 TypeAdapter，批次驗證原始查詢結果時重用已編譯的 schema。
+_COURSE_FEE_LIST_ADAPTER = TypeAdapter(List[_CourseFeeView])
+
+class _EnrollmentCourseRefView(BaseModel):
+    """選課記錄的投影模型，僅取回 `course_id` (以原始 DBRef 形式，不解析 Link) 與 `payment_status`。"""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    course_id: Optional[DBRef] = None
+    payment_status: Optional[str] = None
+
+def _link_id(link) -> Optional[PydanticObjectId]:
+    """取得 Beanie `Link` 所指向文件的 ObjectId；若已是載入的文件則直接取其 `id`。"""
+    if isinstance(link, Link):
+        return link.ref.id
+    return getattr(link, "id", None)
+
 class Payment(Document):
     """
     代表學生繳費單的資料模型，記錄繳費狀態與金額，可與一或多筆選課記錄相關聯。
@@ -48,56 +73,104 @@ class Payment(Document):
     class Settings:
         name = "payments"  # 明確指定集合名稱
         indexes = [
-            IndexModel([("user_id", 1), ("status", 1)], name="user_id_1_status_1"), # 方便查詢某用戶特定狀態的繳費單
+            # 依 Equality-Sort-Range 排序：先以使用者、狀態做等值篩選，再依繳費截止日排序/範圍查詢。
+            # 此索引的前綴 (user_id, status) 已涵蓋原 user_id_1_status_1 索引，故將其移除。
+            IndexModel(
+                [("user_id.$id", 1), ("status", 1), ("payment_due_date", 1)],
+                name="user_id_1_status_1_payment_due_date_1",
+            ), # 方便查詢某用戶特定狀態、依截止日排序的繳費單
+            # 不限使用者的跨帳號查詢 (例如所有待繳且快到期的繳費單) 以 status 開頭，上方索引無法使用。
             IndexModel([("status", 1), ("payment_due_date", 1)], name="status_1_payment_due_date_1"), # 方便查詢待處理且快到期的繳費單
         ]
 
-    async def calculate_amount_due_from_enrollments(self) -> int:
-        """根據關聯的選課記錄計算應繳總金額。
+    @staticmethod
+    async def _fetch_enrollment_refs(enrollment_ids: List[PydanticObjectId]) -> List[_EnrollmentCourseRefView]:
+        """以單次 `$in` 查詢取回選課記錄的 `course_id` 與 `payment_status` 投影。"""
+        if not enrollment_ids:
+            return []
+        from .enrollment import Enrollment # 局部匯入以避免循環依賴
+        return await Enrollment.find(In(Enrollment.id, enrollment_ids)).project(_EnrollmentCourseRefView).to_list()
+
+    @staticmethod
+    async def _sum_course_fees(enrollment_refs: List[_EnrollmentCourseRefView]) -> int:
+        """以單次 `$in` 查詢取回對應課程的費用欄位，並以選課記錄為單位加總。"""
+        course_ids = [ref.course_id.id for ref in enrollment_refs if ref.course_id is not None]
+        if not course_ids:
+            return 0
+        # 直接以 Motor 取回投影後的原始文件，再以 TypeAdapter 一次驗證整個列表，
+        # 省去 Beanie 逐筆建立文件/投影模型的開銷。
+        raw_courses = await Course.get_motor_collection().find(
+            {"_id": {"$in": list(set(course_ids))}},
+            {"credits": 1, "fee_per_credit": 1},
+        ).to_list(None)
+        courses = _COURSE_FEE_LIST_ADAPTER.validate_python(raw_courses)
+        fee_by_course_id = {course.id: int(course.credits * course.fee_per_credit) for course in courses}
+
+        # 以選課記錄為單位加總，與逐筆計算的結果一致
+        return sum(fee_by_course_id.get(cid, 0) for cid in course_ids)
+
+    @classmethod
+    async def calculate_amount_due(cls, enrollment_ids: List[PydanticObjectId]) -> int:
+        """根據選課記錄 ID 計算應繳總金額。
+
+        以兩次批次查詢取代逐筆 `Link.fetch()`：先以 `$in` 一次取回所有選課記錄 (僅投影所需欄位)，
+        再以 `$in` 一次取回其對應課程 (僅投影計算費用所需欄位)，最後在 Python 中加總。
+        無論關聯幾筆選課，皆只需兩次資料庫往返。
 
-        遍歷所有連結的 `Enrollment` 記錄，獲取其對應課程的 `total_fee` 並加總。
+        Args:
+            enrollment_ids (List[PydanticObjectId]): 選課記錄的 ID 列表。
 
         Returns:
             int: 計算得出的應繳總金額。
         """
-        total_due = 0
-        if not self.enrollments:
-            return 0
-            
-        for enrollment_link in self.enrollments:
-            enrollment = await enrollment_link.fetch() # type: ignore
-            if enrollment and enrollment.course_id: # type: ignore
-                course = await enrollment.course_id.fetch() # type: ignore
-                if course and hasattr(course, 'total_fee'):
-                    total_due += course.total_fee
-        return total_due
-
-    @before_event(Insert)
-    async def set_initial_amount_due(self):
+        return await cls._sum_course_fees(await cls._fetch_enrollment_refs(enrollment_ids))
+
+    async def calculate_amount_due_from_enrollments(self) -> int:
+        """根據此繳費單關聯的選課記錄計算應繳總金額。
+
+        Returns:
+            int: 計算得出的應繳總金額。
         """
-        Beanie `Insert` 事件鉤子：在首次插入繳費記錄前執行。
+        enrollment_ids = [eid for eid in map(_link_id, self.enrollments) if eid is not None]
+        return await self.calculate_amount_due(enrollment_ids)
+
+    @classmethod
+    async def create_for_enrollments(
+        cls,
+        user_id: PydanticObjectId,
+        enrollment_ids: List[PydanticObjectId],
+        **kwargs,
+    ) -> "Payment":
+        """為一或多筆選課記錄建立並插入繳費單，於插入前一次算好應繳金額。
+
+        若 `kwargs` 未指定 `amount_due`，則依關聯的選課記錄計算應繳總金額。
+        若只有一筆選課且該選課記錄為無需繳費，則將此繳費記錄直接標註為已完成。
+        選課記錄只查詢一次，金額與無需繳費判斷共用同一份投影結果。
+
+        Args:
+            user_id (PydanticObjectId): 繳費學生的使用者 ID。
+            enrollment_ids (List[PydanticObjectId]): 關聯的選課記錄 ID 列表。
+            **kwargs: 其他 `Payment` 欄位，例如 `payment_due_date`、`notes`。
 
-        如果 `amount_due` (應繳金額) 未被明確設定（仍為初始值 0），
-        則會嘗試根據關聯的選課記錄 (`enrollments`) 計算應繳總金額。
-        此外，若只有一筆選課且該選課記錄為無需繳費，則將此繳費記錄也標註為無需繳費。
+        Returns:
+            Payment: 已插入資料庫的繳費記錄。
         """
-        if self.amount_due == 0 and self.enrollments:
-            self.amount_due = await self.calculate_amount_due_from_enrollments()
-        
+        from .enrollment import PaymentStatus as EnrollmentPaymentStatus # 局部匯入以避免循環依賴
+
+        payment = cls(user_id=user_id, enrollments=enrollment_ids, **kwargs) # type: ignore[arg-type]
+        enrollment_refs = await cls._fetch_enrollment_refs(enrollment_ids)
+
         # 特殊處理：若僅關聯一筆選課，且該選課本身標註為無需繳費
-        if len(self.enrollments) == 1:
-            enrollment_link = self.enrollments[0]
-            enrollment = await enrollment_link.fetch() # type: ignore[attr-defined] # Beanie Link fetch
-            
-            # 局部匯入以避免循環依賴，並獲取 Enrollment 中的 PaymentStatus
-            from .enrollment import PaymentStatus as EnrollmentPaymentStatus
-            
-            if enrollment and enrollment.payment_status == EnrollmentPaymentStatus.NOT_REQUIRED:
-                self.status = PaymentRecordStatus.PAID # 將 PAID 視為無需繳費的最終狀態
-                self.amount_due = 0
-                self.amount_paid = 0 # 也應設定已付金額為0
-                self.notes = "課程無需繳費，自動標記完成。"
+        if len(enrollment_refs) == 1 and enrollment_refs[0].payment_status == EnrollmentPaymentStatus.NOT_REQUIRED.value:
+            payment.status = PaymentRecordStatus.PAID # 將 PAID 視為無需繳費的最終狀態
+            payment.amount_due = 0
+            payment.amount_paid = 0 # 也應設定已付金額為0
+            payment.notes = "課程無需繳費，自動標記完成。"
+        elif "amount_due" not in kwargs:
+            payment.amount_due = await cls._sum_course_fees(enrollment_refs)
 
+        await payment.insert()
+        return payment
 
     async def mark_as_paid(
         self,
@@ -122,17 +195,25 @@ class Payment(Document):
         self.transaction_id = transaction_id
         self.receipt_number = receipt_number
         self.status = PaymentRecordStatus.PAID
-        self.updated_at = get_utc_now()
-        await self.save() # 儲存 Payment 自身的變更
-
-        # 更新所有關聯 Enrollment 的 payment_status
-        from .enrollment import PaymentStatus as EnrollmentPaymentStatus # 局部匯入
-        for enrollment_link in self.enrollments:
-            enrollment = await enrollment_link.fetch() # type: ignore[attr-defined] # Beanie Link fetch
-            if enrollment:
-                enrollment.payment_status = EnrollmentPaymentStatus.PAID
-                # enrollment.payment_record = self # 若 Enrollment 有反向連結欄位，可在此設定
-                await enrollment.save()
+        now = get_utc_now()
+        self.updated_at = now
+
+        # 以單次 update_many 更新所有關聯 Enrollment 的 payment_status，取代逐筆 fetch + save；
+        # 兩者互不相依，與 Payment 自身的儲存並行送出。
+        from .enrollment import Enrollment, PaymentStatus as EnrollmentPaymentStatus # 局部匯入
+        enrollment_ids = [eid for eid in map(_link_id, self.enrollments) if eid is not None]
+        if not enrollment_ids:
+            await self.save() # 儲存 Payment 自身的變更
+            return
+        await asyncio.gather(
+            self.save(), # 儲存 Payment 自身的變更
+            Enrollment.find(In(Enrollment.id, enrollment_ids)).update(
+                Set({
+                    Enrollment.payment_status: EnrollmentPaymentStatus.PAID,
+                    Enrollment.updated_at: now,
+                })
+            ),
+        )
 
     async def save(self, **kwargs):
         """覆寫 `save` 方法以自動更新 `updated_at` 欄位。
@@ -1,7 +1,8 @@
 from datetime import datetime
 from typing import Optional
-from beanie import Document, Link
-from pydantic import Field
+from beanie import Document, Link, PydanticObjectId
+from pydantic import BaseModel, Field
+from pymongo import IndexModel
 from .users import User
 from ..utils.funcs import get_utc_now
 
@@ -19,3 +20,21 @@ class RequiredCourse(Document):
 
     class Settings:
         name = "required_courses"  # 明確指定集合名稱
+        indexes = [
+            # 對應學生儀表板「未完成的應重補修科目」分頁查詢：等值 (user_id, is_remedied)，
+            # 再依 (uploaded_at, _id) 由新到舊排序並以 keyset 續取。Link 欄位以 DBRef 儲存，故使用 user_id.$id。
+            IndexModel(
+                [("user_id.$id", 1), ("is_remedied", 1), ("uploaded_at", -1), ("_id", -1)],
+                name="user_remedied_uploaded_at__id",
+            ),
+        ]
+
+
+class RequiredCourseRow(BaseModel):
+    """學生儀表板「我的應重補修科目」表格用的投影模型，僅取回表格顯示的欄位。"""
+    id: PydanticObjectId = Field(alias="_id")
+    academic_year_taken: str
+    course_code: str
+    course_name: str
+    original_grade: str
+    uploaded_at: datetime # 作為「載入更多」的 keyset 游標
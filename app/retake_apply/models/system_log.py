@@ -1,11 +1,26 @@
+import asyncio
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from enum import Enum
-from beanie import Document, Indexed
-from pydantic import Field
+from beanie import Document, Indexed, PydanticObjectId
+from pydantic import BaseModel, Field
 from pymongo import IndexModel # 匯入 IndexModel
+from reflex.utils import console # Reflex 控制台日誌工具
 from ..utils.funcs import get_utc_now # 改用 get_utc_now
 
+# 系統日誌保存天數，超過者由 TTL 索引自動刪除。
+LOG_RETENTION_DAYS = 90
+
+# 批次寫入設定：`SystemLog.log` 只將日誌放入佇列，由背景工作以 insert_many 批次寫入，
+# 每批最多 `_LOG_BATCH_SIZE` 筆，或自第一筆進入起最多等待 `_LOG_FLUSH_INTERVAL` 秒。
+# 取捨：正常關閉 (`stop_log_writer`) 時佇列會完整寫入；但行程異常終止 (crash、OOM、SIGKILL) 時，
+# 佇列中尚未寫入的日誌 (約最近 `_LOG_FLUSH_INTERVAL` 秒內) 會遺失。
+# 為保留最需要追查的紀錄，`_LOG_DIRECT_WRITE_LEVELS` 中的級別不經佇列，直接寫入資料庫。
+_LOG_BATCH_SIZE = 100
+_LOG_FLUSH_INTERVAL = 0.5
+_log_queue: "Optional[asyncio.Queue[SystemLog]]" = None
+_log_writer_task: Optional[asyncio.Task] = None
+
 class LogLevel(str, Enum):
     """日誌級別列舉"""
     DEBUG = "DEBUG"
@@ -14,6 +29,28 @@ class LogLevel(str, Enum):
     ERROR = "ERROR"
     CRITICAL = "CRITICAL"
 
+_LOG_DIRECT_WRITE_LEVELS = frozenset({LogLevel.ERROR, LogLevel.CRITICAL})
+
+# 日誌級別篩選下拉選單的選項：「全部級別」加上所有 `LogLevel` 成員。
+# 級別在執行期間不會變動，於模組載入時建立一次，由所有連線共用。
+LOG_LEVEL_OPTIONS: tuple[dict[str, str], ...] = (
+    {"label": "全部級別", "value": "ALL"},
+    *({"label": level.name, "value": level.value} for level in LogLevel),
+)
+
+class SystemLogSummary(BaseModel):
+    """日誌列表用的投影模型，不含 `details`。
+
+    `details` 可能包含錯誤堆疊等大型結構，僅在檢視單筆詳情時才需要；
+    列表查詢以此模型投影，可省去傳輸與驗證該欄位的成本。
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    timestamp: datetime
+    level: LogLevel
+    message: str
+    source: Optional[str] = None
+    user_email: Optional[str] = None
+
 class SystemLog(Document):
     """
     代表系統運作日誌的資料模型，用於記錄應用程式的重要操作與錯誤資訊。
@@ -28,8 +65,18 @@ class SystemLog(Document):
     class Settings:
         name = "system_logs"  # 明確指定集合名稱
         indexes = [
-            IndexModel([("timestamp", -1)], name="timestamp_-1"),  # 按創建時間降序索引，方便按時間排序查詢
-            IndexModel([("level", 1)], name="level_1"),  # 按日誌級別索引，方便篩選
+            # TTL 索引：由 MongoDB 自動刪除超過保存期限的日誌，避免集合與索引無限制成長而擠掉選課、繳費等常用索引的快取。
+            # 採遞增鍵，與舊有的 timestamp_-1 索引鍵不同，建立時不會發生衝突；舊索引由 utils/migrations.py 刪除。
+            IndexModel(
+                [("timestamp", 1)],
+                name="timestamp_1_ttl",
+                expireAfterSeconds=LOG_RETENTION_DAYS * 24 * 60 * 60,
+            ),
+            # 日誌頁面依 (timestamp, _id) 降序做 keyset 分頁；TTL 索引只能是單一欄位，
+            # 故另建含 _id 的複合索引，使分頁查詢可直接依序回傳，無需記憶體內排序。
+            IndexModel([("timestamp", -1), ("_id", -1)], name="timestamp_-1__id_-1"),
+            # 以級別等值篩選再依相同順序分頁。其前綴 (level) 已涵蓋原 level_1 索引，故將其移除。
+            IndexModel([("level", 1), ("timestamp", -1), ("_id", -1)], name="level_1_timestamp_-1__id_-1"),
             IndexModel([("user_email", 1)], name="user_email_1"), # 按使用者 Email 索引
             IndexModel([("source", 1)], name="source_1"), # 按來源索引
         ]
@@ -42,9 +89,12 @@ class SystemLog(Document):
         source: Optional[str] = None,
         user_email: Optional[str] = None,
         details: Optional[Dict[str, Any]] = None
-    ) -> "SystemLog":
+    ) -> None:
         """
-        創建並儲存一筆新的系統日誌。
+        創建一筆新的系統日誌並排入背景批次寫入佇列。
+
+        背景寫入工作已啟動時此呼叫不會等待資料庫往返；日誌最晚約 `_LOG_FLUSH_INTERVAL` 秒後寫入，
+        行程異常終止時佇列中的日誌會遺失。ERROR 以上級別，或背景寫入工作未啟動時，則直接寫入資料庫。
 
         Args:
             level (LogLevel): 日誌的級別。
@@ -53,8 +103,7 @@ class SystemLog(Document):
             user_email (Optional[str]): 與此日誌相關的使用者 Email。
             details (Optional[Dict[str, Any]]): 其他結構化的詳細資訊。
 
-        Returns:
-            SystemLog: 已儲存的日誌物件。
+        經由佇列寫入時呼叫端無法取得已寫入的文件 (`id` 尚未產生)，故此方法不回傳日誌物件。
         """
         log_entry = cls(
             timestamp=get_utc_now(), # 確保使用當前 UTC 時間
@@ -64,11 +113,88 @@ class SystemLog(Document):
             user_email=user_email,
             details=details
         )
-        await log_entry.insert()
+        if level not in _LOG_DIRECT_WRITE_LEVELS and \
+           _log_queue is not None and _log_writer_task is not None and not _log_writer_task.done():
+            _log_queue.put_nowait(log_entry) # 非阻塞：交由背景工作批次寫入
+        else:
+            await log_entry.insert() # 重要級別，或背景寫入工作未啟動 (例如獨立腳本) 時直接寫入
         # 也可以考慮同時輸出到標準輸出或日誌檔案
         # print(f"LOG [{log_entry.timestamp}] [{log_entry.level.value}] {log_entry.source or ''} - {log_entry.message} - User: {log_entry.user_email or 'N/A'} - Details: {log_entry.details or '{}'}")
-        return log_entry
+
+    @classmethod
+    def start_log_writer(cls) -> None:
+        """啟動背景批次寫入工作。應於 Beanie 初始化完成後、在事件迴圈中呼叫。"""
+        global _log_queue, _log_writer_task
+        if _log_writer_task is not None and not _log_writer_task.done():
+            return
+        _log_queue = asyncio.Queue()
+        _log_writer_task = asyncio.create_task(_drain_log_queue(_log_queue))
+
+    @classmethod
+    async def stop_log_writer(cls) -> None:
+        """停止背景批次寫入工作，並將佇列中剩餘的日誌寫入資料庫。應於關閉資料庫連線前呼叫。"""
+        global _log_queue, _log_writer_task
+        task, queue = _log_writer_task, _log_queue
+        _log_writer_task, _log_queue = None, None # 之後的 log() 改為直接寫入
+        if task is None or queue is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        remaining: List[SystemLog] = []
+        while not queue.empty():
+            remaining.append(queue.get_nowait())
+        if remaining:
+            await cls.insert_many(remaining)
 
     # 日誌查詢邏輯主要會在 AdminLogsState 中實現，
     # 使用 Beanie 的 find() 方法配合查詢條件 (時間範圍、級別、關鍵字等)。
     # 模型本身不需要額外的複雜查詢方法。
+
+
+async def _insert_batch(batch: List[SystemLog]) -> None:
+    """以單次 insert_many 寫入一批日誌；寫入失敗僅輸出至控制台，不中斷背景工作。
+
+    寫入期間若背景工作被取消 (`stop_log_writer`)，仍等待這一批寫完才傳遞取消，
+    以免已從佇列取出的日誌遺失。
+
+    Args:
+        batch (List[SystemLog]): 要寫入的日誌。
+    """
+    insert = asyncio.ensure_future(SystemLog.insert_many(batch))
+    try:
+        await asyncio.shield(insert)
+    except asyncio.CancelledError:
+        await asyncio.wait([insert])
+        if not insert.cancelled() and insert.exception() is not None:
+            console.error(f"批次寫入 {len(batch)} 筆系統日誌失敗：{insert.exception()}")
+        raise
+    except Exception as e: # 日誌寫入失敗不應中斷背景工作
+        console.error(f"批次寫入 {len(batch)} 筆系統日誌失敗：{e}")
+
+async def _drain_log_queue(queue: "asyncio.Queue[SystemLog]") -> None:
+    """背景工作：持續從佇列取出日誌，湊滿一批或逾時後以單次 insert_many 寫入。
+
+    Args:
+        queue (asyncio.Queue[SystemLog]): `SystemLog.log` 放入日誌的佇列。
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch: List[SystemLog] = [await queue.get()]
+        deadline = loop.time() + _LOG_FLUSH_INTERVAL
+        try:
+            while len(batch) < _LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # 停止時仍寫入已取出的這一批，其餘由 stop_log_writer 處理
+            await _insert_batch(batch)
+            raise
+        await _insert_batch(batch)
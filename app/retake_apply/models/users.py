@@ -1,11 +1,12 @@
-import base64
-import os
+import re
+import secrets
 from datetime import datetime
-from typing import Annotated, Optional, List
+from typing import Annotated, Any, Dict, Optional, List
 
-from beanie import Document, Indexed
-from pydantic import EmailStr, Field, computed_field
-from ..utils.funcs import get_now, get_utc_now
+from beanie import Document, Indexed, Insert, PydanticObjectId, Replace, Save, SaveChanges, before_event
+from pydantic import BaseModel, EmailStr, Field, PrivateAttr, computed_field, field_validator, model_validator
+from pymongo import IndexModel, UpdateOne # 匯入 IndexModel 與批次更新操作
+from ..utils.funcs import get_utc_now
 
 from enum import Enum
 
@@ -16,6 +17,28 @@ class UserGroup(str, Enum):
     SYSTEM_ADMIN = "系統管理者"
     AUTHENTICATED_USER = "已驗證使用者"
 
+# 最後登入時間的最短寫入間隔 (秒)；間隔內的重複登入不再更新 `last_login`。
+LAST_LOGIN_MIN_INTERVAL = 60.0
+
+def needs_last_login_update(
+    last_login: Optional[datetime], now: datetime, min_interval: float = LAST_LOGIN_MIN_INTERVAL
+) -> bool:
+    """判斷是否需要寫入新的最後登入時間。
+
+    Args:
+        last_login (Optional[datetime]): 目前記錄的最後登入時間 (UTC)。
+        now (datetime): 當前 UTC 時間。
+        min_interval (float): 兩次寫入之間的最短間隔 (秒)。
+
+    Returns:
+        bool: 若尚無記錄或距上次記錄已達 `min_interval` 秒則為 `True`。
+    """
+    if last_login is None:
+        return True
+    if last_login.tzinfo is None: # MongoDB 取回的 datetime 預設不帶時區，視為 UTC
+        last_login = last_login.replace(tzinfo=now.tzinfo)
+    return (now - last_login).total_seconds() >= min_interval
+
 class User(Document):
     """
     代表系統中的任何使用者，透過 Google 進行身分驗證。
@@ -25,6 +48,7 @@ class User(Document):
     google_sub: Annotated[str, Indexed(unique=True)]  # 來自 Google ID Token 的 sub，唯一識別碼
     email: Annotated[EmailStr, Indexed(unique=True)]  # 來自 Google Auth 的電子郵件，主要索引鍵
     fullname: Optional[str] = None  # 來自 Google Auth 的全名
+    fullname_lower: Optional[str] = None  # fullname 的小寫版本，供不分大小寫的前綴搜尋使用索引 (既有資料由 utils/migrations.py 回填)
     picture: Optional[str] = None  # 來自 Google Auth 的頭像 URL
     student_id: Optional[str] = None  # 校內學號，若為學生則填入
     id_card_number_hash: Optional[str] = None  # 校內身分證號碼的雜湊值，用於學生身份核對
@@ -32,42 +56,191 @@ class User(Document):
     created_at: datetime = Field(default_factory=get_utc_now)  # 帳號創建時間
     last_login: Optional[datetime] = None  # 最後登入時間
     is_active: bool = True  # 帳號是否啟用
-    token_secret: Optional[str] = None  # 令牌密鑰
+    token_secret: Optional[str] = None  # 令牌密鑰：20 位元組隨機值的 URL-safe Base64 字串 (27 字元，字元集 A-Z a-z 0-9 - _)
+
+    # `student_campus_id` 的快取：(計算時所依據的 email, 校園 ID)，不會寫入資料庫。
+    # 以 email 作為快取鍵，email 若被重新指派則自動重新計算。
+    _campus_id_cache: Optional[tuple[str, str]] = PrivateAttr(default=None)
 
     @computed_field
     @property
     def student_campus_id(self) -> str:
         """計算並返回學生的校園 ID（通常是電子郵件地址的 "@" 前綴部分）。
 
+        結果會依 email 快取，序列化使用者列表時不需對每次存取重新切割字串。
+
         Returns:
             str: 從使用者電子郵件中提取的校園 ID。
         """
-        return self.email.split("@")[0]
+        email = self.email
+        cache = self._campus_id_cache
+        if cache is None or cache[0] != email:
+            cache = (email, email.partition("@")[0])
+            self._campus_id_cache = cache
+        return cache[1]
 
     def update_token_secret(self) -> None:
         """產生並更新使用者的令牌密鑰 (`token_secret`)。
         
-        使用 `os.urandom` 產生隨機位元組並進行 Base32 編碼。
+        使用 `secrets.token_urlsafe` 產生 20 位元組隨機值的 URL-safe Base64 字串。
         此密鑰可用於例如 CSRF 保護或其他安全相關令牌的生成。
         """
-        self.token_secret = base64.b32encode(os.urandom(20)).decode()
+        self.token_secret = secrets.token_urlsafe(20)
+
+    async def update_login_datetime(self, min_interval: float = LAST_LOGIN_MIN_INTERVAL) -> bool:
+        """更新使用者的最後登入時間 (`last_login`) 為當前 UTC 時間。
+
+        以單一 `$set` 直接寫入 `last_login` 欄位，不需先讀取或整份儲存文件。
+        若距上次記錄的登入時間未滿 `min_interval` 秒則略過寫入，避免頻繁重新登入造成多餘的資料庫往返。
 
-    def update_login_datetime(self) -> None:
-        """更新使用者的最後登入時間 (`last_login`) 為當前 UTC 時間。"""
-        self.last_login = get_utc_now()
+        Args:
+            min_interval (float): 兩次寫入之間的最短間隔 (秒)，預設為 `LAST_LOGIN_MIN_INTERVAL`。
+
+        Returns:
+            bool: 若實際寫入資料庫則為 `True`，因間隔過短而略過則為 `False`。
+        """
+        now = get_utc_now()
+        if not needs_last_login_update(self.last_login, now, min_interval):
+            return False
+        await self.get_motor_collection().update_one(
+            {"_id": self.id}, {"$set": {"last_login": now}}
+        )
+        self.last_login = now
+        return True
 
     def update_groups(self, new_groups: List[UserGroup]) -> None:
         """更新使用者的角色群組列表。
 
         將提供的新群組列表與使用者現有的群組列表進行合併（取聯集），
-        以確保不重複且包含所有新舊群組。
+        以確保不重複且包含所有新舊群組。既有群組的順序保持不變，新群組依序附加於後。
 
         Args:
             new_groups (List[UserGroup]): 要添加到使用者的新角色群組列表。
         """
-        current_groups_set = set(self.groups)
-        new_groups_set = set(new_groups)
-        self.groups = list(current_groups_set | new_groups_set)
+        existing = set(self.groups)
+        for group in new_groups:
+            if group not in existing:
+                self.groups.append(group)
+                existing.add(group)
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def sync_fullname_lower(self) -> None:
+        """寫入前同步 `fullname_lower`，使其與 `fullname` 保持一致。
+
+        以 `$set` 直接更新 `fullname` 時不會觸發此事件，呼叫端需一併寫入 `fullname_lower`。
+        """
+        self.fullname_lower = self.fullname.lower() if self.fullname else None
+
+    @classmethod
+    async def bulk_set_groups(cls, updates: Dict[PydanticObjectId, List[UserGroup]]) -> int:
+        """以單次 `bulk_write` 更新多位使用者的角色群組。
+
+        每位使用者一個 `$set` 操作，全部於一次資料庫往返中送出；`ordered=False` 使單筆失敗不影響其他操作。
+
+        Args:
+            updates (Dict[PydanticObjectId, List[UserGroup]]): 使用者 ID 對應其新的完整角色群組列表。
+
+        Returns:
+            int: 實際被修改的使用者數量。
+        """
+        if not updates:
+            return 0
+        operations = [
+            UpdateOne({"_id": user_id}, {"$set": {"groups": [group.value for group in groups]}})
+            for user_id, groups in updates.items()
+        ]
+        result = await cls.get_motor_collection().bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    @staticmethod
+    def build_search_query(term: str) -> Dict[str, Any]:
+        """依搜尋關鍵字建立可使用索引的使用者查詢條件。
+
+        不含空白的關鍵字以錨定開頭 (`^`) 的前綴比對 Email、姓名 (`fullname_lower`) 與學號。
+        三個欄位皆有索引，且正規表示式不帶 `i` 選項，MongoDB 可將前綴轉為索引範圍掃描：
+        Email (由 Google 登入寫入，皆為小寫) 與 `fullname_lower` 以轉小寫後的關鍵字比對，
+        學號則依原樣比對。關鍵字中的特殊字元會先跳脫。
+        注意：僅比對欄位開頭，不支援任意位置比對。
+        含空白的多字詞關鍵字則改用 `user_search` 全文檢索索引。
+
+        Args:
+            term (str): 使用者輸入的搜尋關鍵字。
+
+        Returns:
+            Dict[str, Any]: 傳給 `User.find()` 的查詢條件；關鍵字為空時為空字典。
+        """
+        term = term.strip()
+        if not term:
+            return {}
+        if any(ch.isspace() for ch in term):
+            return {"$text": {"$search": term}}
+        lower_prefix = f"^{re.escape(term.lower())}"
+        return {"$or": [
+            {"email": {"$regex": lower_prefix}},
+            {"fullname_lower": {"$regex": lower_prefix}},
+            # 明確限定字串型別，使查詢符合 uniq_student_id 部分索引的篩選條件
+            {"student_id": {"$type": "string", "$regex": f"^{re.escape(term)}"}},
+        ]}
 
     class Settings:
         name = "users"  # 明確指定集合名稱
+        indexes = [
+            # 學號與身分證雜湊用於學生身份核對與 CSV 匯入時的等值查詢，需唯一。
+            # 未填寫時欄位會以 null 寫入，sparse 索引仍會收錄 null，多筆 null 將違反唯一性；
+            # 故改以部分索引僅收錄字串值，非學生帳號不佔索引空間。
+            IndexModel(
+                [("student_id", 1)],
+                name="uniq_student_id",
+                unique=True,
+                partialFilterExpression={"student_id": {"$type": "string"}},
+            ),
+            IndexModel([("fullname_lower", 1)], name="fullname_lower_1"), # 姓名前綴搜尋
+            # 使用者管理列表預設只列出啟用中的帳號，並依 (created_at, _id) 降序做 keyset 分頁；
+            # 部分索引僅收錄 is_active 為 True 的文件，停用帳號不佔索引空間。
+            IndexModel(
+                [("created_at", -1), ("_id", -1)],
+                name="active_created_at__id",
+                partialFilterExpression={"is_active": True},
+            ),
+            # 含空白的多字詞搜尋改用全文檢索
+            IndexModel(
+                [("fullname", "text"), ("email", "text"), ("student_id", "text")],
+                name="user_search",
+            ),
+            IndexModel(
+                [("id_card_number_hash", 1)],
+                name="uniq_id_card_number_hash",
+                unique=True,
+                partialFilterExpression={"id_card_number_hash": {"$type": "string"}},
+            ),
+        ]
+
+class UserAdminRow(BaseModel):
+    """使用者管理列表用的投影模型，僅含表格顯示與角色編輯所需欄位。
+
+    列表會同步至前端狀態，投影可避免 `token_secret`、`id_card_number_hash` 等敏感欄位送到瀏覽器，
+    同時減少傳輸與驗證的資料量。
+    """
+    id: PydanticObjectId = Field(alias="_id")
+    fullname: Optional[str] = None
+    email: EmailStr
+    student_id: Optional[str] = None
+    created_at: datetime # 分頁 keyset 的排序鍵
+    # 以角色的字串值保存：前端徽章直接顯示字串，不需在每次渲染時取 Enum 的 value。
+    groups: List[str] = Field(default_factory=list)
+    # 角色的顯示文字，於建立列表項目時組好一次，表格直接顯示，不需逐列再展開 groups。
+    roles_display: str = ""
+
+    @field_validator("groups", mode="before")
+    @classmethod
+    def _groups_to_values(cls, groups: Any) -> Any:
+        """將 `UserGroup` 成員轉為其字串值；自資料庫讀取的原始值本即為字串。"""
+        if isinstance(groups, list):
+            return [g.value if isinstance(g, UserGroup) else g for g in groups]
+        return groups
+
+    @model_validator(mode="after")
+    def _build_roles_display(self) -> "UserAdminRow":
+        """依 `groups` 組出 `roles_display`。"""
+        self.roles_display = " · ".join(self.groups)
+        return self
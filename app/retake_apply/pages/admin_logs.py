@@ -6,33 +6,46 @@
 """
 import reflex as rx
 from reflex_google_auth import require_google_login
-import json # 用於格式化顯示 JSON details
 
 from ..states.auth import require_group # 引入權限群組檢查裝飾器
 from ..models.users import UserGroup
-from ..models.system_log import LogLevel # 匯入 LogLevel
-from ..components import navbar
+from ..models.system_log import LogLevel, LOG_LEVEL_OPTIONS # 匯入 LogLevel 與級別篩選選項
+from ..components import navbar, pagination_bar
 from ..states.admin_logs_state import AdminLogsState # 匯入此頁面專用的狀態管理類
 from ..utils.funcs import format_datetime_to_taipei_str # 匯入日期時間格式化輔助函式
 
-def get_log_level_color(level: LogLevel) -> str:
+# 文字篩選欄位於停止輸入多久 (毫秒) 後才同步至後端；查詢仍由 on_blur 或「套用」觸發。
+FILTER_INPUT_DEBOUNCE_MS = 300
+
+# 日誌級別對應的 Radix Themes 顏色方案，未列出的級別使用 "gray"。
+_LOG_LEVEL_COLORS: dict[LogLevel, str] = {
+    LogLevel.ERROR: "red",
+    LogLevel.CRITICAL: "red",
+    LogLevel.WARNING: "amber",
+    LogLevel.INFO: "blue",
+    LogLevel.DEBUG: "gray",
+}
+
+def get_log_level_color(level: LogLevel | rx.Var) -> str | rx.Var:
     """根據日誌級別返回對應的 Radix Themes 顏色方案 (color_scheme) 字串。
 
+    在 `rx.foreach` 中傳入的是前端的 Var，無法在 Python 端比較，
+    此時以同一份對照表產生 `rx.match`，交由前端依值選色。
+
     Args:
-        level (LogLevel): 日誌的級別。
+        level (LogLevel | rx.Var): 日誌的級別，或代表日誌級別的 Var。
 
     Returns:
-        str: 對應於該日誌級別的顏色方案字串 (例如 "red", "amber", "blue")。
+        str | rx.Var: 對應於該日誌級別的顏色方案字串 (例如 "red", "amber", "blue")，
+            傳入 Var 時則為對應的 Var。
     """
-    if level == LogLevel.ERROR or level == LogLevel.CRITICAL:
-        return "red"
-    if level == LogLevel.WARNING:
-        return "amber"
-    if level == LogLevel.INFO:
-        return "blue"
-    if level == LogLevel.DEBUG:
-        return "gray"
-    return "gray"
+    if isinstance(level, rx.Var):
+        return rx.match(
+            level,
+            *((lvl.value, color) for lvl, color in _LOG_LEVEL_COLORS.items()),
+            "gray",
+        )
+    return _LOG_LEVEL_COLORS.get(level, "gray")
 
 @rx.page(
     route="/admin/logs", # 建議使用 admin/ 前綴
@@ -61,10 +74,10 @@ def admin_logs_page() -> rx.Component:
                     rx.select.root(
                         rx.select.trigger(placeholder="選擇日誌級別"),
                         rx.select.content(
-                            rx.foreach(
-                                AdminLogsState.log_level_options, # type: ignore
-                                lambda option: rx.select.item(option["label"], value=option["value"])
-                            )
+                            *[
+                                rx.select.item(option["label"], value=option["value"])
+                                for option in LOG_LEVEL_OPTIONS
+                            ]
                         ),
                         value=AdminLogsState.filter_level_str,
                         on_change=AdminLogsState.set_filter_level, # type: ignore
@@ -79,6 +92,7 @@ def admin_logs_page() -> rx.Component:
                         value=AdminLogsState.filter_source,
                         on_change=AdminLogsState.set_filter_source, # type: ignore
                         on_blur=AdminLogsState.apply_all_filters, # type: ignore
+                        debounce_timeout=FILTER_INPUT_DEBOUNCE_MS,
                     ),
                     grid_column="span 2",
                 ),
@@ -89,6 +103,7 @@ def admin_logs_page() -> rx.Component:
                         value=AdminLogsState.filter_user_email,
                         on_change=AdminLogsState.set_filter_user_email, # type: ignore
                         on_blur=AdminLogsState.apply_all_filters, # type: ignore
+                        debounce_timeout=FILTER_INPUT_DEBOUNCE_MS,
                     ),
                     grid_column="span 2",
                 ),
@@ -99,6 +114,7 @@ def admin_logs_page() -> rx.Component:
                         value=AdminLogsState.filter_message_content,
                         on_change=AdminLogsState.set_filter_message_content, # type: ignore
                         on_blur=AdminLogsState.apply_all_filters, # type: ignore
+                        debounce_timeout=FILTER_INPUT_DEBOUNCE_MS,
                     ),
                     grid_column="span 6", # 佔滿剩餘空間
                 ),
@@ -167,7 +183,7 @@ def admin_logs_page() -> rx.Component:
                                     )
                                 ),
                                 rx.table.cell(
-                                    rx.button("詳情", on_click=lambda: AdminLogsState.view_log_details(log), size="1") # type: ignore
+                                    rx.button("詳情", on_click=AdminLogsState.view_log_details(log.id), size="1") # type: ignore
                                 ),
                             )
                         )
@@ -177,6 +193,9 @@ def admin_logs_page() -> rx.Component:
                 ),
                 rx.text("找不到符合條件的日誌記錄。", color_scheme="gray", margin_top="1em")
             ),
+
+            # 分頁控制
+            pagination_bar(AdminLogsState),
             
             # 日誌詳細資訊 Modal
             rx.dialog.root(
@@ -196,7 +215,7 @@ def admin_logs_page() -> rx.Component:
                                 rx.vstack(
                                     rx.text("詳細資料:", weight="bold", margin_top="0.5em"),
                                     rx.code_block(
-                                        json.dumps(AdminLogsState.selected_log_for_details.details, indent=2, ensure_ascii=False), # type: ignore
+                                        AdminLogsState.selected_log_details_json, # 由後端序列化一次的 JSON 字串
                                         language="json",
                                         can_copy=True,
                                         theme="light", # 或其他主題
@@ -8,27 +8,18 @@ import reflex as rx
 from reflex_google_auth import require_google_login
 from ..states.auth import require_group # 從 auth.py 匯入權限群組檢查裝飾器
 from ..models.users import UserGroup # UserGroup Enum 用於角色定義與檢查
-from ..components import navbar # 引入共用的導覽列元件
+from ..components import navbar, pagination_bar # 引入共用的導覽列與分頁列元件
 from ..states.admin_users_state import AdminUsersState # 匯入此頁面專用的狀態管理類
 
-def render_roles_badges(user_groups: rx.Var[list[UserGroup]]) -> rx.Component:
-    """輔助函式，用於將使用者的角色群組列表渲染為一組徽章 (badges)。
+# 搜尋欄位於停止輸入多久 (毫秒) 後才送出查詢。
+SEARCH_INPUT_DEBOUNCE_MS = 300
 
-    Args:
-        user_groups (rx.Var[list[UserGroup]]): 一個包含使用者角色群組 (UserGroup Enum)
-                                               列表的 Reflex Var。
-
-    Returns:
-        rx.Component: 一個包含多個 `rx.badge` 的 `rx.hstack` 元件，
-                      每個徽章代表一個角色。
-    """
-    return rx.hstack(
-        rx.foreach(
-            user_groups,
-            lambda group: rx.badge(group.value, color_scheme="blue", margin_right="0.25em")
-        ),
-        spacing="1" # badge 之間的間距
-    )
+# 可在角色編輯 Modal 中勾選的角色。
+# 排除 AUTHENTICATED_USER，因為它應由系統自動管理（所有登入者皆有）。
+# 角色集合在執行期間不會變動，故於模組載入時決定一次，頁面編譯時即展開為靜態的核取方塊。
+_MANAGEABLE_ROLES: tuple[UserGroup, ...] = tuple(
+    ug for ug in UserGroup if ug is not UserGroup.AUTHENTICATED_USER
+)
 
 @rx.page(
     route="/admin/users", # 建議使用 admin/ 前綴
@@ -54,12 +45,18 @@ def admin_users_page() -> rx.Component:
                 rx.input(
                     placeholder="依姓名、Email或學號搜尋...",
                     value=AdminUsersState.search_term,
-                    on_change=AdminUsersState.set_search_term, # type: ignore
-                    on_blur=AdminUsersState.load_all_users, # 失焦時觸發搜尋
+                    on_change=AdminUsersState.handle_search_term_change, # type: ignore # 停止輸入後即觸發搜尋
+                    debounce_timeout=SEARCH_INPUT_DEBOUNCE_MS,
                     width="300px"
                 ),
                 rx.button("搜尋", on_click=AdminUsersState.load_all_users, size="2"), # type: ignore
+                rx.checkbox(
+                    "顯示已停用帳號",
+                    checked=AdminUsersState.show_inactive_users,
+                    on_change=AdminUsersState.toggle_show_inactive_users, # type: ignore
+                ),
                 spacing="3",
+                align="center",
                 margin_bottom="1.5em"
             ),
 
@@ -80,11 +77,11 @@ def admin_users_page() -> rx.Component:
                             lambda user: rx.table.row(
                                 rx.table.cell(user.fullname or user.email),
                                 rx.table.cell(user.student_id or "N/A"),
-                                rx.table.cell(render_roles_badges(user.groups)), # type: ignore
+                                rx.table.cell(rx.text(user.roles_display)), # 角色文字已於載入時組好
                                 rx.table.cell(
                                     rx.button(
                                         "編輯角色", 
-                                        on_click=lambda: AdminUsersState.start_edit_user_roles(user), # type: ignore
+                                        on_click=AdminUsersState.start_edit_user_roles(user.id), # type: ignore
                                         size="1"
                                     )
                                 ),
@@ -96,6 +93,9 @@ def admin_users_page() -> rx.Component:
                 ),
                 rx.text("找不到符合條件的使用者，或尚無使用者。", color_scheme="gray", margin_top="1em")
             ),
+
+            # 分頁控制
+            pagination_bar(AdminUsersState, f"第 {AdminUsersState.page + 1} 頁，共 {AdminUsersState.total_users} 位使用者"),
             
             # 角色編輯 Modal
             rx.dialog.root(
@@ -110,14 +110,14 @@ def admin_users_page() -> rx.Component:
                     rx.scroll_area( # 如果角色過多，可以滾動
                         rx.checkbox_group.root(
                             rx.flex(
-                                rx.foreach(
-                                    AdminUsersState.get_all_manageable_roles_for_checkbox(),
-                                    lambda role_option: rx.checkbox_group.item(
-                                        role_option["value"], # checkbox value
-                                        rx.text(role_option["label"]), # checkbox label
+                                *[
+                                    rx.checkbox_group.item(
+                                        role.value, # checkbox value
+                                        rx.text(role.value), # checkbox label
                                         padding_y="0.25em"
                                     )
-                                ),
+                                    for role in _MANAGEABLE_ROLES
+                                ],
                                 direction="column",
                                 spacing="2",
                             ),
@@ -9,19 +9,25 @@ from reflex_google_auth import require_google_login
 
 from ..states.auth import require_group # 引入權限群組檢查裝飾器
 from ..models.users import UserGroup # UserGroup Enum 用於角色定義與檢查
-from ..models.course import Course # Course 模型用於類型提示
+from ..models.course import CourseCardView # 課程卡片投影模型用於類型提示
 from ..components import navbar # 引入共用的導覽列元件
 from ..states.course_selection_state import CourseSelectionState # 匯入此頁面專用的狀態管理類
 
-def render_course_card(course: rx.Var[Course]) -> rx.Component: # course 參數是一個 Reflex Var 包裝的 Course 物件
+# 搜尋欄位於停止輸入多久 (毫秒) 後才送出查詢。
+SEARCH_INPUT_DEBOUNCE_MS = 300
+
+# 課程卡片格線在各斷點的欄數。
+_COURSE_GRID_COLUMNS = {"initial": "1", "sm": "1", "md": "2", "lg": "3"}
+
+def render_course_card(course: rx.Var[CourseCardView]) -> rx.Component: # course 參數是一個 Reflex Var 包裝的 CourseCardView 物件
     """渲染單個課程的資訊卡片元件。
 
     卡片包含課程的基本資訊、上課時段以及一個選課按鈕。
-    按鈕的狀態（文字、是否可點擊）會根據課程是否已被選修以及登記是否開放而動態變化。
+    按鈕的狀態（文字、是否可點擊）由後端依課程是否已被選修以及登記是否開放預先算好。
 
     Args:
-        course (rx.Var[Course]): 一個 Reflex Var，其值為 `Course` 模型實例，
-                                 代表要渲染的課程。
+        course (rx.Var[CourseCardView]): 一個 Reflex Var，其值為 `CourseCardView` 投影實例，
+                                         代表要渲染的課程。
 
     Returns:
         rx.Component: 代表單個課程卡片的 Reflex UI 元件。
@@ -30,31 +36,7 @@ def render_course_card(course: rx.Var[Course]) -> rx.Component: # course 參數
     # 通常會被自動包裝成 rx.Var。因此，可以直接存取其屬性，如 course.id。
     # Reflex 會在後端處理 Var 的解析。
 
-    is_enrolled = CourseSelectionState.enrolled_course_ids_this_year.contains(course.id.to(str)) # type: ignore
-    
-    button_text = rx.cond(
-        is_enrolled,
-        "已選修",
-        rx.cond(
-            CourseSelectionState.is_registration_open,
-            "我要選課",
-            "未開放登記" 
-        )
-    )
-    
-    # 禁用按鈕的條件:
-    # 1. 登記未開放
-    # 2. 已選修此課程
-    # 3. 當前使用者不是學生 (如果需要嚴格限制只有學生能點擊)
-    button_disabled = rx.cond(
-        ~CourseSelectionState.is_registration_open,
-        True, # 登記未開放則禁用
-        rx.cond(
-            is_enrolled,
-            True, # 已選修則禁用
-            ~CourseSelectionState.has_student_role # 如果不是學生角色，則禁用 (可選)
-        )
-    )
+    # is_enrolled、按鈕文字與是否禁用皆已由 CourseSelectionState 依已選課程與登記狀態預先算好。
 
     return rx.card(
         rx.vstack(
@@ -69,19 +51,12 @@ def render_course_card(course: rx.Var[Course]) -> rx.Component: # course 參數
             rx.text(f"學分數: {course.credits.to(str)}", size="2"), # type: ignore
             rx.text(f"總費用: NT$ {course.total_fee.to(str)}", weight="bold", size="2"), # type: ignore
             
-            rx.cond(course.time_slots.length() > 0, # type: ignore
+            rx.cond(course.time_slots_display.length() > 0, # type: ignore
                 rx.vstack(
                     rx.text("上課時段:", weight="medium", size="2", margin_top="0.5em"),
                     rx.foreach(
-                        course.time_slots, # type: ignore
-                        lambda ts: rx.hstack(
-                            rx.text(f"星期{ts.day_of_week} {ts.period} ({ts.start_time}-{ts.end_time})"),
-                            rx.cond(ts.location, rx.text(" @" + ts.location), rx.text("")),
-                            rx.cond(ts.week_number, rx.text(" (W" + ts.week_number.to_string() + ")"), rx.text("")),
-                            spacing="1",
-                            align_items="center", # 確保 hstack 內的元素對齊
-                            font_size="0.8em", # 調整字體大小以匹配原來的 size="1"
-                        )
+                        course.time_slots_display, # type: ignore # 時段文字已於後端格式化
+                        lambda slot_text: rx.text(slot_text, font_size="0.8em"),
                     ),
                     align_items="start",
                     spacing="1",
@@ -89,19 +64,45 @@ def render_course_card(course: rx.Var[Course]) -> rx.Component: # course 參數
                 rx.text("上課時段未定", size="1", color_scheme="gray")
             ),
             rx.button(
-                button_text,
+                course.button_text, # type: ignore
                 on_click=lambda: CourseSelectionState.handle_select_course(course.id.to(str)), # type: ignore
-                is_disabled=button_disabled, # type: ignore
+                is_disabled=course.button_disabled, # type: ignore
                 width="100%",
                 margin_top="1em",
                 size="2"
             ),
             spacing="2",
             align_items="stretch", # 使卡片內容撐開
-        )
+        ),
+        # 以課程 ID 作為 React key (rx.foreach 預設以索引為 key)，
+        # 搜尋使列表順序改變時，React 可沿用既有卡片而非全部重新掛載。
+        key=course.id.to(str), # type: ignore
     )
 
 # --- 主頁面 ---
+def _course_grid() -> rx.Component:
+    """可選課程的卡片格線；沒有課程時顯示提示文字。僅在登記開放時渲染。
+
+    Returns:
+        rx.Component: 課程格線或無課程提示。
+    """
+    return rx.cond(
+        CourseSelectionState.available_courses.length() > 0, # type: ignore
+        rx.grid(
+            rx.foreach(
+                CourseSelectionState.available_courses,
+                render_course_card
+            ),
+            columns=_COURSE_GRID_COLUMNS, # 響應式欄數
+            spacing="3",
+            width="100%"
+        ),
+        rx.center(
+            rx.text("目前無開放選修的課程，或無符合篩選條件的課程。", color_scheme="gray"),
+            padding_y="2em"
+        )
+    )
+
 @rx.page(
     route="/course-selection", 
     title="課程選擇",
@@ -131,38 +132,26 @@ def course_selection_page() -> rx.Component:
                 placeholder="搜尋科目名稱、代碼或教師...",
                 value=CourseSelectionState.search_term,
                 on_change=CourseSelectionState.handle_search_term_change, # type: ignore
+                debounce_timeout=SEARCH_INPUT_DEBOUNCE_MS, # 停止輸入後才查詢，避免每個按鍵都重新載入課程
                 margin_bottom="1.5em",
                 width="100%",
                 max_width="500px"
             ),
 
+            # 外層先判斷是否載入中：is_registration_open 於載入完成前尚未確定，
+            # 載入完成後才依登記是否開放顯示課程格線或登記時間訊息。
             rx.cond(
                 CourseSelectionState.is_loading, # type: ignore
                 rx.center(rx.spinner(size="3"), padding_y="3em"),
                 rx.cond(
                     CourseSelectionState.is_registration_open, # type: ignore
-                    rx.cond(
-                        CourseSelectionState.available_courses.length() > 0, # type: ignore
-                        rx.grid(
-                            rx.foreach(
-                                CourseSelectionState.available_courses,
-                                render_course_card
-                            ),
-                            columns={"initial": "1", "sm": "1", "md": "2", "lg": "3"}, # 響應式欄數
-                            spacing="3",
-                            width="100%"
-                        ),
-                        rx.center(
-                            rx.text("目前無開放選修的課程，或無符合篩選條件的課程。", color_scheme="gray"),
-                            padding_y="2em"
-                        )
-                    ),
+                    _course_grid(),
                     # 如果登記未開放，顯示登記時間訊息
                     rx.center(
                         rx.text(CourseSelectionState.registration_time_message, color_scheme="orange", weight="bold"), # type: ignore
                         padding_y="2em"
                     )
-                )
+                ),
             ),
             width="100%",
             padding_x="2em",
@@ -10,9 +10,72 @@ from reflex_google_auth import require_google_login
 from ..states.dashboard_state import DashboardState # 匯入儀表板頁面專用的狀態管理類
 from ..models.users import UserGroup # UserGroup Enum 用於角色判斷
 from ..components import navbar # 引入共用的導覽列元件
-from ..utils.funcs import format_datetime_to_taipei_str # 匯入日期時間格式化輔助函式
+
+# --- 靜態子樹常數 ---
+# 以下子樹於模組載入時建立一次，各儀表板函式直接引用，避免重複建構元件物件。
+_MANAGER_GRID = rx.grid(
+    rx.link(rx.card(rx.text("管理課程資料", weight="medium")), href="/manager/courses", width="100%"),
+    rx.link(rx.card(rx.text("管理學生應重補修名單", weight="medium")), href="/manager/students", width="100%"),
+    rx.link(rx.card(rx.text("設定學年度與登記時間", weight="medium")), href="/manager/academic-year", width="100%"),
+    rx.link(rx.card(rx.text("管理學生報名資料", weight="medium")), href="/manager/enrollments", width="100%"),
+    columns="2", spacing="3", width="100%", max_width="800px"
+)
+
+_ADMIN_GRID = rx.grid(
+    rx.link(rx.card(rx.text("管理使用者角色", weight="medium")), href="/admin/users", width="100%"),
+    rx.link(rx.card(rx.text("查閱系統日誌", weight="medium")), href="/admin/logs", width="100%"),
+    # 系統管理者也可以存取課程管理者的學年度設定功能
+    rx.link(rx.card(rx.text("設定學年度與登記時間", weight="medium")), href="/manager/academic-year", width="100%"),
+    columns="2", spacing="3", width="100%", max_width="800px"
+)
+
+# 已登入但無任何預期角色時顯示的內容；僅群組文字依狀態變動。
+_NO_ROLE_CONTENT = rx.vstack(
+    rx.heading("歡迎", size="7", color_scheme="orange"),
+    rx.text("您的帳號已登入，但目前無特定操作權限。"),
+    rx.text("如有疑問請聯繫系統管理者。"),
+    rx.text(f"您的群組: {DashboardState.current_user_groups.to_string()}"), # type: ignore
+    align_items="center", spacing="3"
+)
 
 # --- 學生儀表板元件 ---
+def enrollment_detail_dialog() -> rx.Component:
+    """渲染選課詳情彈出視窗，內容於學生點擊「檢視詳情」時才由後端載入。
+
+    Returns:
+        rx.Component: 選課詳情的 Dialog 元件。
+    """
+    detail = DashboardState.selected_enrollment_detail
+    return rx.dialog.root(
+        rx.dialog.content(
+            rx.dialog.title("選課詳情"),
+            rx.cond(
+                detail,
+                rx.vstack(
+                    rx.text(f"科目: {detail.course_code} {detail.course_name}", weight="bold"), # type: ignore
+                    rx.text(f"學年度: {detail.academic_year}"), # type: ignore
+                    rx.text(f"學分數: {detail.credits}"), # type: ignore
+                    rx.text(f"應繳費用: {detail.total_fee} 元"), # type: ignore
+                    rx.text(f"授課教師: {detail.instructor_name}"), # type: ignore
+                    rx.text("上課時間:"),
+                    rx.foreach(detail.time_slots_display, lambda slot_text: rx.text(slot_text, size="2")), # type: ignore
+                    rx.hstack(rx.badge(detail.status), rx.badge(detail.payment_status), spacing="2"), # type: ignore
+                    rx.text(f"報名時間: {detail.enrolled_at_display}"), # type: ignore
+                    rx.cond(detail.updated_at_display, rx.text(f"最後更新: {detail.updated_at_display}")), # type: ignore
+                    spacing="2",
+                    align_items="start",
+                    width="100%",
+                ),
+                rx.text("沒有選擇選課記錄。") # 理論上不應顯示
+            ),
+            rx.dialog.close(
+                rx.button("關閉", on_click=DashboardState.close_enrollment_detail_modal, margin_top="1em", variant="soft") # type: ignore
+            ),
+        ),
+        open=DashboardState.show_enrollment_detail_modal, # type: ignore
+        on_open_change=DashboardState.set_show_enrollment_detail_modal, # type: ignore
+    )
+
 def student_dashboard_content() -> rx.Component:
     """渲染學生角色的儀表板內容。
 
@@ -23,7 +86,7 @@ def student_dashboard_content() -> rx.Component:
     """
     return rx.vstack(
         rx.heading("學生儀表板", size="7", margin_bottom="1em"),
-        rx.text(f"目前學年度: {DashboardState.current_academic_year_display}", color_scheme="gray", margin_bottom="1em"), # type: ignore
+        rx.text(DashboardState.academic_year_banner, color_scheme="gray", margin_bottom="1em"), # type: ignore
 
         rx.heading("我的應重補修科目 (未完成)", size="5", margin_top="1em", margin_bottom="0.5em"),
         rx.cond(
@@ -45,6 +108,7 @@ def student_dashboard_content() -> rx.Component:
                             rx.table.cell(req.course_name),
                             rx.table.cell(req.academic_year_taken),
                             rx.table.cell(req.original_grade),
+                            key=req.id.to(str), # 以記錄 ID 作為穩定 key，載入更多時既有列不需重建
                         )
                     )
                 ),
@@ -52,6 +116,16 @@ def student_dashboard_content() -> rx.Component:
             ),
             rx.text("目前沒有需要重補修的科目記錄。", color_scheme="gray")
         ),
+        rx.cond(
+            DashboardState.required_has_more, # type: ignore
+            rx.button(
+                "載入更多",
+                on_click=DashboardState.load_more_required, # type: ignore
+                variant="soft",
+                size="2",
+                align_self="center",
+            ),
+        ),
 
         rx.heading("我已登記的課程 (本學期)", size="5", margin_top="1.5em", margin_bottom="0.5em"),
         rx.cond(
@@ -64,19 +138,28 @@ def student_dashboard_content() -> rx.Component:
                         rx.table.column_header_cell("選課狀態"),
                         rx.table.column_header_cell("繳費狀態"),
                         rx.table.column_header_cell("報名時間"),
+                        rx.table.column_header_cell("詳情"),
                     )
                 ),
                 rx.table.body(
                     rx.foreach(
                         DashboardState.my_enrollments,
                         lambda enroll: rx.table.row(
-                            # 真正的解決方案是在 DashboardState 中預先載入課程資訊
-                            # 這裡僅作規避錯誤處理
-                            rx.table.cell(rx.cond(enroll.course_id, "[課程代碼待載入]", "N/A")), # type: ignore
-                            rx.table.cell(rx.cond(enroll.course_id, "[課程名稱待載入]", "N/A")), # type: ignore
-                            rx.table.cell(rx.badge(rx.cond(enroll.status, enroll.status, "N/A"))), # 直接使用 enroll.status
-                            rx.table.cell(rx.badge(rx.cond(enroll.payment_status, enroll.payment_status, "N/A"))), # 直接使用 enroll.payment_status
-                            rx.table.cell(rx.cond(enroll.enrolled_at, format_datetime_to_taipei_str(enroll.enrolled_at, "%Y-%m-%d %H:%M"), "N/A")), # 使用輔助函式
+                            # 課程代碼與名稱已由 DashboardState 以 aggregation 預先合併
+                            rx.table.cell(rx.cond(enroll.course_code, enroll.course_code, "N/A")), # type: ignore
+                            rx.table.cell(rx.cond(enroll.course_name, enroll.course_name, "N/A")), # type: ignore
+                            rx.table.cell(rx.badge(enroll.status)), # type: ignore
+                            rx.table.cell(rx.badge(enroll.payment_status)), # type: ignore
+                            rx.table.cell(enroll.enrolled_at_display), # 台北時間字串已於後端格式化
+                            rx.table.cell(
+                                rx.button(
+                                    "檢視詳情",
+                                    on_click=DashboardState.load_enrollment_detail(enroll.id), # type: ignore
+                                    size="1",
+                                    variant="soft",
+                                )
+                            ),
+                            key=enroll.id.to(str), # 以選課記錄 ID 作為穩定 key
                         )
                     )
                 ),
@@ -84,6 +167,7 @@ def student_dashboard_content() -> rx.Component:
             ),
             rx.text("您在本學期尚未登記任何課程。", color_scheme="gray")
         ),
+        enrollment_detail_dialog(),
         rx.link(rx.button("前往選課", margin_top="2em", size="3"), href="/course-selection"),
         align_items="stretch", # 使表格等元件寬度一致
         width="100%",
@@ -101,15 +185,9 @@ def course_manager_dashboard_content() -> rx.Component:
     """
     return rx.vstack(
         rx.heading("課程管理者儀表板", size="7", margin_bottom="1em"),
-        rx.text(f"歡迎，{DashboardState.tokeninfo.get('name', '課程管理者')}!", margin_bottom="1em"), # type: ignore
+        rx.text(f"歡迎，{DashboardState.welcome_name}!", margin_bottom="1em"), # type: ignore
         rx.text(f"目前系統運作學年度: {DashboardState.current_academic_year_display}", weight="bold", margin_bottom="1.5em"), # type: ignore
-        rx.grid(
-            rx.link(rx.card(rx.text("管理課程資料", weight="medium")), href="/manager/courses", width="100%"),
-            rx.link(rx.card(rx.text("管理學生應重補修名單", weight="medium")), href="/manager/students", width="100%"),
-            rx.link(rx.card(rx.text("設定學年度與登記時間", weight="medium")), href="/manager/academic-year", width="100%"),
-            rx.link(rx.card(rx.text("管理學生報名資料", weight="medium")), href="/manager/enrollments", width="100%"),
-            columns="2", spacing="3", width="100%", max_width="800px"
-        ),
+        _MANAGER_GRID,
         align_items="center", # 使 Grid 內容水平居中
         width="100%",
         spacing="4"
@@ -126,14 +204,8 @@ def system_admin_dashboard_content() -> rx.Component:
     """
     return rx.vstack(
         rx.heading("系統管理者儀表板", size="7", margin_bottom="1em"),
-        rx.text(f"歡迎，{DashboardState.tokeninfo.get('name', '系統管理者')}!", margin_bottom="1.5em"), # type: ignore
-         rx.grid(
-            rx.link(rx.card(rx.text("管理使用者角色", weight="medium")), href="/admin/users", width="100%"),
-            rx.link(rx.card(rx.text("查閱系統日誌", weight="medium")), href="/admin/logs", width="100%"),
-            # 系統管理者也可以存取課程管理者的學年度設定功能
-            rx.link(rx.card(rx.text("設定學年度與登記時間", weight="medium")), href="/manager/academic-year", width="100%"),
-            columns="2", spacing="3", width="100%", max_width="800px"
-        ),
+        rx.text(f"歡迎，{DashboardState.welcome_name}!", margin_bottom="1.5em"), # type: ignore
+        _ADMIN_GRID,
         align_items="center", # 使 Grid 內容水平居中
         width="100%",
         spacing="4"
@@ -162,25 +234,13 @@ def dashboard_page() -> rx.Component:
             rx.cond(
                 DashboardState.is_loading_dashboard_data, # type: ignore
                 rx.center(rx.spinner(size="3"), padding_y="5em"),
-                rx.cond(
-                    DashboardState.is_system_admin, # type: ignore
-                    system_admin_dashboard_content(),
-                    rx.cond(
-                        DashboardState.is_course_manager, # type: ignore
-                        course_manager_dashboard_content(),
-                        rx.cond(
-                            DashboardState.is_student, # type: ignore
-                            student_dashboard_content(),
-                            # 若已登入但無任何預期角色 (例如僅有 AUTHENTICATED_USER)
-                            rx.vstack(
-                                rx.heading("歡迎", size="7", color_scheme="orange"),
-                                rx.text("您的帳號已登入，但目前無特定操作權限。"),
-                                rx.text("如有疑問請聯繫系統管理者。"),
-                                rx.text(f"您的群組: {DashboardState.current_user_groups.to_string()}"), # type: ignore
-                                align_items="center", spacing="3"
-                            )
-                        )
-                    )
+                # 以單一 rx.match 依角色優先順序選擇分支，取代多層巢狀 rx.cond
+                rx.match(
+                    DashboardState.primary_role,
+                    ("admin", system_admin_dashboard_content()),
+                    ("manager", course_manager_dashboard_content()),
+                    ("student", student_dashboard_content()),
+                    _NO_ROLE_CONTENT, # 若已登入但無任何預期角色 (例如僅有 AUTHENTICATED_USER)
                 )
             ),
             width="100%",
@@ -40,6 +40,12 @@ def _login_form() -> rx.Component:
         class_name="max-w-[30rem] w-full justify-center items-center",
     )
 
+# 登入表單不依賴任何狀態，於模組載入時建立一次，`index` 直接引用。
+_LOGIN_FORM = _login_form()
+
+# 已登入時顯示的載入指示器，等待掛載後重定向至儀表板；同樣於模組載入時建立一次。
+_REDIRECT_SPINNER = rx.center(rx.spinner(size="3"), width="100%", height="100%", on_mount=rx.redirect('/dashboard')) # 讓 spinner 填滿 flex item
+
 # @rx.page(on_load=AuthState.check_login_and_redirect_from_index)
 @rx.page("/", title="重補修申請登記系統")
 def index() -> rx.Component:
@@ -55,9 +61,9 @@ def index() -> rx.Component:
         rx.cond(
             AuthState.token_is_valid,  # 檢查使用者是否已通過 Google 驗證
             # 如果已驗證，顯示載入指示器，等待 on_load 事件處理重定向
-            rx.center(rx.spinner(size="3"), width="100%", height="100%", on_mount=rx.redirect('/dashboard')), # 讓 spinner 填滿 flex item
+            _REDIRECT_SPINNER,
             # 否則，顯示登入表單
-            _login_form() # _login_form 本身已經有 class_name="max-w-[30rem] w-full ..."
+            _LOGIN_FORM # _login_form 本身已經有 class_name="max-w-[30rem] w-full ..."
         ),
         class_name="h-[100dvh] justify-center items-center", # 應用於外層 flex
         width="100%",
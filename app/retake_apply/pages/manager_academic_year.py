@@ -11,7 +11,6 @@ from ..models.users import UserGroup # UserGroup Enum 用於角色定義與檢
 # AcademicYearSetting 模型主要在 ManagerAcademicYearState 中使用，此處不直接匯入。
 from ..components import navbar # 引入共用的導覽列元件
 from ..states.manager_academic_year_state import ManagerAcademicYearState # 匯入此頁面專用的狀態管理類
-from ..utils.funcs import format_datetime_to_taipei_str # 匯入日期時間格式化輔助函式
 
 @rx.page(
     route="/manager/academic-year",  # 建議使用 manager/ 前綴以區分管理功能
@@ -146,11 +145,19 @@ def manager_academic_year_page() -> rx.Component:
                             ManagerAcademicYearState.academic_year_history,
                             lambda setting: rx.table.row(
                                 rx.table.cell(setting.academic_year),
-                                rx.table.cell(format_datetime_to_taipei_str(setting.registration_start_time, "%Y-%m-%d %H:%M") if setting.registration_start_time else "未設定"),
-                                rx.table.cell(format_datetime_to_taipei_str(setting.registration_end_time, "%Y-%m-%d %H:%M") if setting.registration_end_time else "未設定"),
-                                rx.table.cell(setting.set_by_user_email or "N/A"),
-                                rx.table.cell(format_datetime_to_taipei_str(setting.set_at, "%Y-%m-%d %H:%M:%S") if setting.set_at else "N/A"), # 加上 if 判斷
-                                rx.table.cell(rx.badge("是", color_scheme="green") if setting.is_active else rx.badge("否", color_scheme="gray")),
+                                # 時間與設定者的顯示字串已於後端格式化，此處直接綁定
+                                rx.table.cell(setting.registration_start_display),
+                                rx.table.cell(setting.registration_end_display),
+                                rx.table.cell(setting.set_by_display),
+                                rx.table.cell(setting.set_at_display),
+                                rx.table.cell(
+                                    rx.cond(
+                                        setting.is_active,
+                                        rx.badge("是", color_scheme="green"),
+                                        rx.badge("否", color_scheme="gray"),
+                                    )
+                                ),
+                                key=setting.id.to(str),
                             )
                         )
                     ),
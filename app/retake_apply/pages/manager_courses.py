@@ -11,7 +11,7 @@ from typing import Dict, Any # List for type hint
 from ..states.auth import require_group # 引入權限群組檢查裝飾器
 from ..models.users import UserGroup # UserGroup Enum 用於角色定義與檢查
 from ..models.course import VALID_PERIODS # VALID_PERIODS 用於節次下拉選單，Course 模型主要在 State 中使用
-from ..components import navbar # 引入共用的導覽列元件
+from ..components import navbar, pagination_bar # 引入共用的導覽列與分頁列元件
 from ..states.manager_courses_state import ManagerCoursesState, EMPTY_TIME_SLOT_DICT # 匯入此頁面專用的狀態管理類
 
 # --- Helper function to render time slot form ---
@@ -336,6 +336,8 @@ def manager_courses_page() -> rx.Component:
                 ),
                 rx.text("找不到課程或目前篩選條件下無課程。", color_scheme="gray", margin_top="1em")
             ),
+            # 分頁控制
+            pagination_bar(ManagerCoursesState),
 
             # 新增課程 Modal
             rx.dialog.root(
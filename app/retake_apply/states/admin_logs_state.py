@@ -6,20 +6,27 @@
 - 管理篩選條件的狀態。
 - 控制日誌詳細資訊彈出視窗的顯示。
 """
+import json
 import reflex as rx
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta # 用於日期篩選的轉換
-from beanie.odm.fields import PydanticObjectId # type: ignore # 用於可能的 ID 操作，儘管此處未直接使用
+from beanie.odm.fields import PydanticObjectId # type: ignore # 用於依 ID 取回完整日誌
 
 from .auth import AuthState # 基礎身份驗證狀態
+from .pagination_state import KeysetPaginationMixin # keyset 分頁的共用狀態與翻頁事件
 from ..models.users import UserGroup # 用於權限檢查
-from ..models.system_log import SystemLog, LogLevel # SystemLog 模型及 LogLevel Enum
+from ..models.system_log import SystemLog, SystemLogSummary, LogLevel # SystemLog 模型、列表投影模型及 LogLevel Enum
 
-class AdminLogsState(AuthState):
+# 日誌列表每頁筆數。分頁採 keyset (依 timestamp、_id 降序)，翻頁時不需 skip 前面的記錄。
+LOG_PAGE_SIZE = 50
+# 日誌列表排序：_id 作為同一時間戳記錄的穩定次序
+LOG_SORT = [("timestamp", -1), ("_id", -1)]
+
+class AdminLogsState(KeysetPaginationMixin, AuthState):
     """管理系統日誌查閱頁面的狀態與相關邏輯。
 
     Attributes:
-        logs_list (rx.Var[List[SystemLog]]): 從資料庫載入的日誌記錄列表。
+        logs_list (rx.Var[List[SystemLogSummary]]): 從資料庫載入的日誌記錄列表 (不含 `details`)。
         filter_level_str (rx.Var[str]): 用於篩選日誌級別的字串 ("ALL" 或 LogLevel 的值)。
         filter_source (rx.Var[str]): 用於篩選日誌來源的字串。
         filter_user_email (rx.Var[str]): 用於篩選使用者 Email 的字串。
@@ -28,9 +35,11 @@ class AdminLogsState(AuthState):
         filter_end_date (rx.Var[str]): 篩選日誌的結束日期 (YYYY-MM-DD)。
         show_details_modal (rx.Var[bool]): 控制是否顯示日誌詳細資訊彈出視窗。
         selected_log_for_details (rx.Var[Optional[SystemLog]]): 當前在彈出視窗中顯示的日誌物件。
+        page (rx.Var[int]): 目前頁碼 (從 0 起算)，由 `KeysetPaginationMixin` 提供。
+        has_next_page (rx.Var[bool]): 是否還有更舊的日誌可供翻頁，由 `KeysetPaginationMixin` 提供。
     """
 
-    logs_list: List[SystemLog] = []
+    logs_list: List[SystemLogSummary] = []
     
     # 篩選條件狀態變數
     filter_level_str: str = "ALL"  # 綁定 Select，值為 LogLevel.value 或 "ALL"
@@ -44,18 +53,19 @@ class AdminLogsState(AuthState):
     show_details_modal: bool = False
     selected_log_for_details: Optional[SystemLog] = None
 
-    @rx.var
-    def log_level_options(self) -> List[Dict[str, str]]:
-        """提供給日誌級別篩選下拉選單的選項列表。
+    @rx.var(cache=True)
+    def selected_log_details_json(self) -> str:
+        """將選取日誌的 `details` 格式化為縮排的 JSON 字串，供詳細資訊視窗顯示。
 
-        包含 "全部級別" 以及所有 `LogLevel` Enum 的成員。
+        僅在 `selected_log_for_details` 變動時於後端序列化一次，前端直接顯示字串。
 
         Returns:
-            List[Dict[str, str]]: 選項列表，每個選項是一個包含 "label" 和 "value" 的字典。
+            str: 格式化後的 JSON 字串；若未選取日誌或無詳細資料則為空字串。
         """
-        options = [{"label": "全部級別", "value": "ALL"}]
-        options.extend([{"label": level.name, "value": level.value} for level in LogLevel])
-        return options
+        if not self.selected_log_for_details or not self.selected_log_for_details.details:
+            return ""
+        # default=str：details 中可能含有 datetime、ObjectId 等非 JSON 原生型別
+        return json.dumps(self.selected_log_for_details.details, indent=2, ensure_ascii=False, default=str)
 
     async def on_page_load(self):
         """頁面載入時執行的非同步操作。
@@ -71,11 +81,15 @@ class AdminLogsState(AuthState):
         await self.fetch_logs()
 
     async def fetch_logs(self):
-        """根據當前的篩選條件從資料庫非同步載入日誌記錄。
+        """根據當前的篩選條件，從第一頁重新載入日誌記錄。"""
+        self._reset_pagination()
+        await self._load_current_page()
+
+    def _build_query_conditions(self) -> Dict[str, Any]:
+        """依目前的篩選條件組出 MongoDB 查詢條件。
 
-        將篩選條件應用於 `SystemLog.find()` 查詢，
-        結果按時間戳降序排列，並限制最多載入 200 筆記錄。
-        查詢結果會更新 `self.logs_list` 狀態變數。
+        Returns:
+            Dict[str, Any]: 傳給 `SystemLog.find()` 的查詢條件。
         """
         query_conditions: Dict[str, Any] = {}
         
@@ -116,20 +130,45 @@ class AdminLogsState(AuthState):
         if date_filter:
             query_conditions["timestamp"] = date_filter # 模型中已改為 timestamp
         
-        self.logs_list = await SystemLog.find(query_conditions, sort=[("timestamp", -1)]).limit(200).to_list()
+        return query_conditions
+
+    def _page_end_key(self) -> Optional[Tuple[datetime, PydanticObjectId]]:
+        """目前頁最後一筆日誌的 (timestamp, _id)，作為下一頁的 keyset 起點。"""
+        if not self.logs_list:
+            return None
+        last_log = self.logs_list[-1]
+        return (last_log.timestamp, last_log.id)
+
+    async def _load_current_page(self):
+        """載入 `self.page` 所指的一頁日誌記錄，並更新 `logs_list` 與 `has_next_page`。
+
+        以上一頁最後一筆的 (timestamp, _id) 作為 keyset 起點，由複合索引直接定位，
+        翻頁成本不隨頁數增加。多取一筆用於判斷是否還有下一頁。
+        """
+        query_conditions = self._keyset_query(self._build_query_conditions(), LOG_SORT)
+        page_logs = await SystemLog.find(
+            query_conditions,
+            sort=LOG_SORT,
+            # 傳遞給 Motor cursor，使一頁 (含判斷下一頁的多取一筆) 在單一批次內回傳；
+            # 預設首批為 101 筆，LOG_PAGE_SIZE 日後調大時也不會多一次 getMore 往返。
+            batch_size=LOG_PAGE_SIZE + 1,
+        ).limit(LOG_PAGE_SIZE + 1).project(SystemLogSummary).to_list() # 列表不需 details，於檢視詳情時再取回
+        self.logs_list = self._take_page(page_logs, LOG_PAGE_SIZE)
+
+    async def view_log_details(self, log_id: str):
+        """載入並顯示指定日誌記錄的詳細資訊彈出視窗。
 
-    async def view_log_details(self, log: SystemLog):
-        """設定並顯示指定日誌記錄的詳細資訊彈出視窗。
+        列表僅載入不含 `details` 的投影，故在此依 ID 取回完整的日誌文件。
 
         Args:
-            log (SystemLog): 要在彈出視窗中顯示的日誌物件。
+            log_id (str): 要在彈出視窗中顯示的日誌 ID。
         """
+        log = await SystemLog.get(PydanticObjectId(log_id)) if log_id else None
         if log:
             self.selected_log_for_details = log
             self.show_details_modal = True
         else:
-            # 理論上，從 UI 點擊傳入的 log 物件不應為 None。
-            # 此處為防禦性程式碼。
+            # 日誌可能已被 TTL 索引刪除，或傳入的 ID 無效。
             return rx.toast.error("無法顯示日誌詳情：選擇的日誌無效。") # type: ignore
 
     def close_details_modal(self):
@@ -6,19 +6,31 @@
 - 控制編輯使用者角色的彈出視窗。
 - 處理使用者角色的儲存與更新。
 """
+import asyncio
 import reflex as rx
-from typing import List, Optional, Dict, Any # Set is not used directly for rx.Var, Any for query_conditions
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple # Set is not used directly for rx.Var, Any for query_conditions
 from beanie.odm.fields import PydanticObjectId # type: ignore # 用於將字串 ID 轉換為 ObjectId
 
 from .auth import AuthState # 基礎身份驗證狀態
-from ..models.users import User, UserGroup # User 模型及 UserGroup Enum
+from .pagination_state import KeysetPaginationMixin # keyset 分頁的共用狀態與翻頁事件
+from ..models.users import User, UserAdminRow, UserGroup # User 模型、列表投影模型及 UserGroup Enum
 
-class AdminUsersState(AuthState):
+# 使用者列表每頁筆數。頁面只渲染當頁的表格列，DOM 節點數與使用者總數無關。
+USER_PAGE_SIZE = 50
+# 使用者列表排序：_id 作為同一建立時間的穩定次序
+USER_SORT = [("created_at", -1), ("_id", -1)]
+
+class AdminUsersState(KeysetPaginationMixin, AuthState):
     """管理系統管理者操作使用者角色的狀態與相關邏輯。
 
     Attributes:
-        users_list (rx.Var[List[User]]): 從資料庫載入的使用者列表。
+        users_list (rx.Var[List[UserAdminRow]]): 從資料庫載入的使用者列表 (僅含表格所需欄位)。
         search_term (rx.Var[str]): 用於搜尋使用者列表的關鍵字。
+        show_inactive_users (rx.Var[bool]): 是否一併列出已停用的帳號。
+        page (rx.Var[int]): 目前頁碼 (從 0 起算)，由 `KeysetPaginationMixin` 提供。
+        has_next_page (rx.Var[bool]): 是否還有下一頁，由 `KeysetPaginationMixin` 提供。
+        total_users (rx.Var[int]): 符合目前篩選條件的使用者總數。
         editing_user_id (rx.Var[Optional[str]]): 當前正在編輯角色的使用者 ID (字串形式)。
         editing_user_display_name (rx.Var[str]): 當前正在編輯角色的使用者顯示名稱 (用於 Modal 標題)。
         roles_for_edit_modal (rx.Var[List[str]]): 綁定到角色編輯 Modal 中 CheckboxGroup 的值列表，
@@ -26,8 +38,13 @@ class AdminUsersState(AuthState):
         show_edit_user_modal (rx.Var[bool]): 控制是否顯示編輯使用者角色的彈出視窗。
     """
 
-    users_list: List[User] = []
+    users_list: List[UserAdminRow] = []
+    # 以字串 ID 索引 `users_list`，供事件處理器依 ID 取回列表項目；僅存於後端。
+    _users_by_id: Dict[str, UserAdminRow] = {}
     search_term: str = ""
+    show_inactive_users: bool = False
+
+    total_users: int = 0 # 符合目前篩選條件的使用者總數
     
     # --- 角色修改 Modal 相關狀態 ---
     editing_user_id: Optional[str] = None
@@ -50,22 +67,60 @@ class AdminUsersState(AuthState):
         await self.load_all_users()
 
     async def load_all_users(self):
-        """根據 `search_term` 從資料庫非同步載入或篩選使用者列表。
+        """根據 `search_term` 從第一頁重新載入或篩選使用者列表。
+
+        如果 `search_term` 為空，則載入所有使用者；除非 `show_inactive_users` 為 `True`，否則僅列出啟用中的帳號。
+        否則，會以姓名、Email 或學號的開頭進行比對 (姓名與 Email 不區分大小寫)，
+        含空白的多字詞則改用全文檢索，詳見 `User.build_search_query`。
+        查詢結果按創建時間降序排列，每頁 `USER_PAGE_SIZE` 筆。
+        符合條件的總數僅在篩選條件變更時 (即此處) 計算一次，與第一頁查詢並行送出；翻頁不重新計數。
+        """
+        self._reset_pagination()
+        self.total_users, _ = await asyncio.gather(
+            User.find(self._build_query_conditions()).count(),
+            self._load_current_page(),
+        )
+
+    def _build_query_conditions(self) -> Dict[str, Any]:
+        """依搜尋關鍵字與是否列出停用帳號組出查詢條件 (不含分頁條件)。
 
-        如果 `search_term` 為空，則載入所有使用者。
-        否則，會根據姓名、Email 或學號進行模糊查詢 (不區分大小寫)。
-        查詢結果按創建時間降序排列，並更新 `self.users_list`。
+        Returns:
+            Dict[str, Any]: 傳給 `User.find()` 的查詢條件。
+        """
+        query_conditions: Dict[str, Any] = User.build_search_query(self.search_term)
+        if not self.show_inactive_users:
+            # 與部分索引 active_created_at__id 的篩選條件相同，未搜尋時可直接依序讀取該索引
+            query_conditions["is_active"] = True
+        return query_conditions
+
+    def _page_end_key(self) -> Optional[Tuple[datetime, PydanticObjectId]]:
+        """目前頁最後一位使用者的 (created_at, _id)，作為下一頁的 keyset 起點。"""
+        if not self.users_list:
+            return None
+        last_user = self.users_list[-1]
+        return (last_user.created_at, last_user.id)
+
+    async def _load_current_page(self):
+        """載入 `self.page` 所指的一頁使用者，並更新 `users_list`、`_users_by_id` 與 `has_next_page`。
+
+        以上一頁最後一筆的 (created_at, _id) 作為 keyset 起點，翻頁不需 skip；多取一筆用於判斷是否還有下一頁。
         """
-        query_conditions: Dict[str, Any] = {}
-        if self.search_term:
-            search_regex = {"$regex": self.search_term, "$options": "i"}
-            query_conditions["$or"] = [
-                {"fullname": search_regex},
-                {"email": search_regex},
-                {"student_id": search_regex},
-            ]
-        
-        self.users_list = await User.find(query_conditions).sort("-created_at").to_list()
+        query_conditions = self._keyset_query(self._build_query_conditions(), USER_SORT)
+        page_users = await User.find(
+            query_conditions,
+            sort=USER_SORT,
+        ).limit(USER_PAGE_SIZE + 1).project(UserAdminRow).to_list()
+        self.users_list = self._take_page(page_users, USER_PAGE_SIZE)
+        self._users_by_id = {str(user.id): user for user in self.users_list}
+
+    async def toggle_show_inactive_users(self, checked: bool):
+        """切換是否列出已停用的帳號，並重新載入使用者列表。
+
+        Args:
+            checked (bool): 是否列出已停用的帳號。
+        """
+        self.show_inactive_users = checked
+        await self.load_all_users()
 
     async def handle_search_term_change(self, term: str):
         """處理搜尋關鍵字變更的事件。
@@ -78,12 +133,17 @@ class AdminUsersState(AuthState):
         self.search_term = term
         await self.load_all_users()
 
-    def start_edit_user_roles(self, user: User):
+    def start_edit_user_roles(self, user_id: str):
         """準備並開啟編輯指定使用者角色的彈出視窗。
 
+        前端僅傳入使用者 ID，列表項目由 `_users_by_id` 取回，不需重新查詢資料庫。
+
         Args:
-            user (User): 要編輯其角色的使用者物件。
+            user_id (str): 要編輯其角色的使用者 ID (字串形式)。
         """
+        user = self._users_by_id.get(user_id)
+        if user is None:
+            return rx.toast.error("錯誤：找不到指定的使用者，請重新整理列表。") # type: ignore
         self.editing_user_id = str(user.id)
         self.editing_user_display_name = user.fullname or user.email
         # get_user_role_values 輔助函式返回 List[str]，用於 CheckboxGroup
@@ -134,10 +194,14 @@ class AdminUsersState(AuthState):
                UserGroup.SYSTEM_ADMIN not in new_groups_enum:
                 return rx.toast.error("操作不允許：系統管理員無法移除自身的管理員權限。") # type: ignore
 
-            user_to_update.groups = new_groups_enum
-            await user_to_update.save()
+            if set(new_groups_enum) == set(user_to_update.groups):
+                # 角色未變更：不寫入資料庫，也不重新載入列表
+                self.close_edit_user_modal()
+                return rx.toast.info(f"使用者 {user_to_update.email} 的角色未變更。") # type: ignore
+
+            await User.bulk_set_groups({user_to_update.id: new_groups_enum}) # 以 $set 僅更新 groups 欄位
             
-            await self.load_all_users() # 重新載入使用者列表以更新 UI
+            await self._load_current_page() # 重新載入目前頁面以更新 UI
             self.close_edit_user_modal() # 關閉 Modal
             return rx.toast.success(f"使用者 {user_to_update.email} 的角色已成功更新。") # type: ignore
         except Exception as e:
@@ -146,7 +210,7 @@ class AdminUsersState(AuthState):
             return rx.toast.error(f"更新角色時發生錯誤：{str(e)}") # type: ignore
 
     # --- 輔助 getter 方法 ---
-    def get_user_role_values(self, user: User) -> List[str]:
+    def get_user_role_values(self, user: UserAdminRow) -> List[str]:
         """獲取指定使用者當前角色的字串值列表。
 
         此列表主要用於初始化角色編輯 Modal 中的 CheckboxGroup。
@@ -154,30 +218,10 @@ class AdminUsersState(AuthState):
         不應在 UI 中作為可選項單獨管理。
 
         Args:
-            user (User): 要獲取其角色值的使用者物件。
+            user (UserAdminRow): 要獲取其角色值的使用者列表項目。
 
         Returns:
             List[str]: 使用者目前擁有的角色對應的 `UserGroup.value` 字串列表
                        (不含 `AUTHENTICATED_USER`)。
         """
-        return [g.value for g in user.groups if g != UserGroup.AUTHENTICATED_USER]
-
-    def get_all_manageable_roles_for_checkbox(self) -> List[Dict[str, str]]:
-        """獲取所有可在 UI (CheckboxGroup) 中管理的角色選項。
-
-        排除 `UserGroup.AUTHENTICATED_USER`，因為它不是一個可直接指派或移除的角色。
-        其他所有在 `UserGroup` Enum 中定義的角色都會被包含。
-
-        Returns:
-            List[Dict[str, str]]: 用於 CheckboxGroup 的選項列表，
-                                 每個選項是一個包含 "label" 和 "value" 的字典，
-                                 兩者均為角色的 `UserGroup.value`。
-        """
-        # 排除 AUTHENTICATED_USER，因為它應由系統自動管理（所有登入者皆有）。
-        # 系統管理員 (SYSTEM_ADMIN) 角色是否應在此處列出讓其他管理員指派，
-        # 取決於具體的權限設計。此處假設所有非 AUTHENTICATED_USER 的角色均可被管理。
-        return [
-            {"label": ug.value, "value": ug.value} 
-            for ug in UserGroup 
-            if ug != UserGroup.AUTHENTICATED_USER
-        ]
+        return [g for g in user.groups if g != UserGroup.AUTHENTICATED_USER.value]
@@ -4,16 +4,29 @@
 並擴展了其功能以整合本地應用程式的使用者角色 (UserGroup) 管理。
 同時，提供了 `require_group` 裝飾器，用於基於角色的頁面存取控制。
 """
+import time
 import typing
 import functools
 import reflex as rx
 from reflex_google_auth import GoogleAuthState # Google OAuth 基礎狀態
 
-from ..models.users import User, UserGroup # 本地使用者模型與角色列舉
+from ..models.users import User, UserGroup, needs_last_login_update # 本地使用者模型與角色列舉
 from ..utils.funcs import get_utc_now # 使用 UTC 時間
 from beanie.operators import Set # MongoDB 更新操作符
 from reflex.utils import console # Reflex 控制台日誌工具
 
+# 角色位元旗標：`AuthState.role_mask` 以位元 OR 合併使用者的角色，
+# 讓 UI 只需讀取單一整數即可判斷各角色，而非對群組列表逐一呼叫 `.contains()`。
+ROLE_BIT_STUDENT = 1
+ROLE_BIT_COURSE_MANAGER = 2
+ROLE_BIT_SYSTEM_ADMIN = 4
+
+_ROLE_BITS: dict[UserGroup, int] = {
+    UserGroup.STUDENT: ROLE_BIT_STUDENT,
+    UserGroup.COURSE_MANAGER: ROLE_BIT_COURSE_MANAGER,
+    UserGroup.SYSTEM_ADMIN: ROLE_BIT_SYSTEM_ADMIN,
+}
+
 class AuthState(GoogleAuthState):
     """應用程式的身分驗證狀態，整合 Google 身分驗證與本地角色管理。
 
@@ -56,6 +69,33 @@ class AuthState(GoogleAuthState):
             return self.tokeninfo.get("sub")
         return None
     
+    @rx.var(cache=True)
+    def token_expires_at(self) -> int:
+        """獲取當前 Google ID Token 的到期時間 (Unix timestamp)。
+
+        `tokeninfo` 為上游 `GoogleAuthState` 的快取計算變數，簽章驗證僅在 token 變動時執行一次；
+        此處再將 `exp` 欄位解析為整數並快取，`token_is_valid` 只需與當前時間比較。
+
+        Returns:
+            int: Token 的 `exp` 時間戳；若未登入或 token 無法解析則為 0。
+        """
+        try:
+            return int(self.tokeninfo.get("exp", 0)) if self.tokeninfo else 0
+        except (TypeError, ValueError):
+            return 0
+
+    @rx.var
+    def token_is_valid(self) -> bool:
+        """檢查當前 Google ID Token 是否有效且尚未過期。
+
+        覆寫上游實作：每次存取 (例如導覽列的 `rx.cond`) 僅比較快取的 `token_expires_at` 與當前時間，
+        不重新解析 `tokeninfo`。此變數刻意不快取，否則 token 過期後不會重新計算。
+
+        Returns:
+            bool: 若 token 存在且尚未過期則回傳 `True`，否則回傳 `False`。
+        """
+        return self.token_expires_at > time.time()
+
     @rx.var(cache=True)
     def protected_content(self) -> str:
         """一個範例受保護內容，僅限已登入使用者查看。
@@ -93,14 +133,20 @@ class AuthState(GoogleAuthState):
                 if google_sub:
                     existing_user = await User.find_one(User.google_sub == google_sub)
                     if existing_user:
-                        # 更新現有使用者的資訊
-                        await existing_user.update(
-                            Set({ # 使用 Set 操作符僅更新指定欄位
-                                User.fullname: user_name,
-                                User.picture: user_picture,
-                                User.last_login: get_utc_now() # 使用 UTC 時間
-                            })
-                        )
+                        # 僅以 $set 寫入實際變動的欄位；last_login 於 LAST_LOGIN_MIN_INTERVAL 內不重複更新，
+                        # 皆無變動時完全省去此次寫入。
+                        now = get_utc_now() # 使用 UTC 時間
+                        changes: dict[typing.Any, typing.Any] = {}
+                        user_name_lower = user_name.lower() if user_name else None
+                        if existing_user.fullname != user_name or existing_user.fullname_lower != user_name_lower:
+                            changes[User.fullname] = user_name
+                            changes[User.fullname_lower] = user_name_lower # $set 不觸發 before_event，需一併更新
+                        if existing_user.picture != user_picture:
+                            changes[User.picture] = user_picture
+                        if needs_last_login_update(existing_user.last_login, now):
+                            changes[User.last_login] = now
+                        if changes:
+                            await existing_user.update(Set(changes)) # 使用 Set 操作符僅更新指定欄位
                         self._app_user_groups_var = existing_user.groups
                         console.info(f"使用者 {existing_user.fullname} (ID: {google_sub}) 已登入並更新資訊。群組: {existing_user.groups}")
                     else:
@@ -145,6 +191,39 @@ class AuthState(GoogleAuthState):
         # _app_user_groups_var 的值在 Reflex 中會被自動提取
         return self._app_user_groups_var
 
+    @rx.var(cache=True)
+    def role_mask(self) -> int:
+        """獲取當前使用者角色的位元遮罩。
+
+        將 `current_user_groups` 中的學生、課程管理者、系統管理者角色
+        依 `ROLE_BIT_*` 常數以位元 OR 合併為單一整數。
+        僅在 `current_user_groups` 變動時重新計算。
+
+        Returns:
+            int: 角色位元遮罩；未登入或無上述角色時為 0。
+        """
+        mask = 0
+        for group in self.current_user_groups:
+            mask |= _ROLE_BITS.get(group, 0)
+        return mask
+
+    # --- 角色判斷快取計算變數 ---
+    # 僅在 `role_mask` 變動時重新計算，UI 的條件判斷只需讀取單一布林值。
+    @rx.var(cache=True)
+    def is_student(self) -> bool:
+        """檢查當前使用者是否為學生。"""
+        return bool(self.role_mask & ROLE_BIT_STUDENT)
+
+    @rx.var(cache=True)
+    def is_course_manager(self) -> bool:
+        """檢查當前使用者是否為課程管理者。"""
+        return bool(self.role_mask & ROLE_BIT_COURSE_MANAGER)
+
+    @rx.var(cache=True)
+    def is_system_admin(self) -> bool:
+        """檢查當前使用者是否為系統管理者。"""
+        return bool(self.role_mask & ROLE_BIT_SYSTEM_ADMIN)
+
     def is_member_of_any(self, groups_to_check: list[UserGroup]) -> bool:
         """檢查當前登入使用者是否屬於提供的任一群組。
 
@@ -167,8 +246,22 @@ class AuthState(GoogleAuthState):
         if not groups_to_check: # 若未指定任何必要群組
             return True # 則只要登入即可認為有權限 (例如，訪問一般已登入頁面)
         
+        # 學生、課程管理者、系統管理者以快取的 role_mask 位元判斷，不需掃描群組列表；
+        # 其他群組 (例如 AUTHENTICATED_USER) 才回頭檢查 current_user_groups。
+        required_bits = 0
+        other_groups = []
+        for group in groups_to_check:
+            bit = _ROLE_BITS.get(group)
+            if bit:
+                required_bits |= bit
+            else:
+                other_groups.append(group)
+        if self.role_mask & required_bits:
+            return True
+        if not other_groups:
+            return False
         current_groups = self.current_user_groups # 使用快取的群組列表
-        return any(group in current_groups for group in groups_to_check)
+        return any(group in current_groups for group in other_groups)
 
     def logout(self):
         """執行使用者登出操作。
@@ -221,7 +314,7 @@ def default_unauthorized_view_factory(
         rx.text("抱歉，您沒有足夠的權限來存取此頁面或功能。"),
         rx.text("所需群組：", font_weight="bold"),
         rx.hstack(
-            *[rx.badge(group, color_scheme="amber") for group in required_groups], # 直接使用 group
+            *[rx.badge(group.value, color_scheme="amber") for group in required_groups], # 建構時即取出 `.value`，前端直接輸出字串常值
             spacing="2"
         ),
         rx.text("您目前的群組：", font_weight="bold", margin_top="0.5em"),
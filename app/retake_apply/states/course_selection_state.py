@@ -7,15 +7,19 @@
 - 處理學生的選課操作，包括衝堂檢查。
 - 管理使用者已選課程的狀態。
 """
+import asyncio
+import re
 import reflex as rx
-from typing import List, Optional
+from typing import List, Optional, Set
 from beanie.odm.fields import PydanticObjectId # type: ignore # 用於將字串 ID 轉換為 ObjectId
+from beanie.operators import In # MongoDB $in 查詢操作符
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError # 唯一索引衝突
 
 from .auth import AuthState # 基礎身份驗證狀態
-from ..models.course import Course # 課程資料模型
-from ..models.enrollment import Enrollment, EnrollmentStatus, PaymentStatus # 選課記錄模型及相關列舉
-from ..models.users import User, UserGroup # 使用者模型及角色列舉
+from ..models.course import Course, CourseCardView # 課程資料模型及課程卡片投影模型
+from ..models.enrollment import Enrollment, EnrollmentStatus, PaymentStatus, StatusChangeResult, ACTIVE_ENROLLMENT_STATUSES, fetch_enrolled_courses # 選課記錄模型及相關列舉
+from ..models.users import User # 使用者模型
 from ..models.academic_year_setting import AcademicYearSetting # 學年度設定模型
 from ..utils.funcs import check_course_conflict, format_datetime_to_taipei_str # 衝堂檢查及時間格式化輔助函式
 
@@ -23,9 +27,7 @@ class CourseSelectionState(AuthState):
     """管理學生課程選擇頁面的狀態與相關邏輯。
 
     Attributes:
-        available_courses (rx.Var[List[Course]]): 當前學年度可供選擇的課程列表。
-        enrolled_course_ids_this_year (rx.Var[List[str]]): 當前使用者在本學年已成功選修
-                                                          (或待確認) 的課程 ID 列表。
+        available_courses (rx.Var[List[CourseCardView]]): 當前學年度可供選擇的課程列表 (僅含卡片所需欄位)。
         search_term (rx.Var[str]): 用於搜尋課程的關鍵字。
         current_academic_year (rx.Var[str]): 當前系統運作的學年度字串 (例如 "113-1")。
         is_loading (rx.Var[bool]): 標記是否正在從後端載入課程資料。
@@ -33,8 +35,10 @@ class CourseSelectionState(AuthState):
         registration_time_message (rx.Var[str]): 顯示給使用者的關於登記時間的訊息。
     """
 
-    available_courses: List[Course] = []
-    enrolled_course_ids_this_year: List[str] = [] # 儲存已選課程的 ID (字串)
+    available_courses: List[CourseCardView] = []
+    # 當前使用者在本學年已成功選修 (或待確認) 的課程 ID (字串)；僅存於後端，
+    # 用於預先算好每張課程卡片的 is_enrolled 與按鈕狀態。
+    _enrolled_course_ids_this_year: Set[str] = set()
     search_term: str = ""
     current_academic_year: str = ""
     is_loading: bool = False
@@ -42,15 +46,6 @@ class CourseSelectionState(AuthState):
     is_registration_open: bool = False
     registration_time_message: str = "" # 例如 "登記開放中 (開始時間 - 結束時間)"
 
-    @rx.var(cache=True)
-    def has_student_role(self) -> bool:
-        """檢查當前登入使用者是否具有學生 (`UserGroup.STUDENT`) 角色。
-
-        Returns:
-            bool: 若使用者具有學生角色則回傳 `True`，否則回傳 `False`。
-        """
-        return UserGroup.STUDENT in self.current_user_groups
-
     async def _load_current_academic_year_and_settings(self):
         """內部輔助函式，用於載入當前生效的學年度設定，
         並根據設定中的登記起迄時間來更新 `is_registration_open`
@@ -100,31 +95,55 @@ class CourseSelectionState(AuthState):
     async def _load_user_enrollments_for_current_year(self):
         """內部輔助函式，載入當前使用者在本學年度所有有效（非取消狀態）的選課記錄ID。
 
-        結果會更新 `self.enrolled_course_ids_this_year` 狀態變數。
+        結果會更新 `self._enrolled_course_ids_this_year`，並重新標註課程卡片的選修狀態。
         """
         if not self.token_is_valid or not self.current_user_google_id or \
            not self.current_academic_year or self.current_academic_year == "未設定":
-            self.enrolled_course_ids_this_year = []
+            self._enrolled_course_ids_this_year = set()
+            self._apply_course_card_flags()
             return
 
         current_user_db = await User.find_one(User.google_sub == self.current_user_google_id)
         if not current_user_db:
-            self.enrolled_course_ids_this_year = []
+            self._enrolled_course_ids_this_year = set()
+            self._apply_course_card_flags()
             return
         
-        # 定義有效的選課狀態，用於判斷是否為已選修課程
-        valid_enrollment_statuses = [EnrollmentStatus.SUCCESS, EnrollmentStatus.PENDING_CONFIRMATION]
-        
-        enrollments = await Enrollment.find(
-            Enrollment.user_id.id == current_user_db.id, # type: ignore[attr-defined] # Beanie Link ID
-            Enrollment.academic_year == self.current_academic_year,
-            Enrollment.status.is_in(valid_enrollment_statuses) # type: ignore # Beanie is_in operator
-        ).project(Enrollment.course_id).to_list() # 僅投影 course_id 以提高效率
+        # 以 distinct 直接由資料庫取回 course_id 所指向的 ObjectId：
+        # 不需解碼整份選課文件，也不會為每筆記錄建立 Beanie Link 物件。
+        course_ids = await Enrollment.get_motor_collection().distinct(
+            "course_id.$id",
+            {
+                "user_id.$id": current_user_db.id,
+                "academic_year": self.current_academic_year,
+                "status": {"$in": [status.value for status in ACTIVE_ENROLLMENT_STATUSES]},
+            },
+        )
         
-        # 將獲取的課程 ID 轉換為字串列表
-        self.enrolled_course_ids_this_year = [
-            str(enroll.course_id.id) for enroll in enrollments if enroll.course_id # type: ignore[attr-defined]
-        ]
+        # 將獲取的課程 ID 轉換為字串集合
+        self._enrolled_course_ids_this_year = {str(course_id) for course_id in course_ids}
+        self._apply_course_card_flags()
+
+    def _apply_course_card_flags(self):
+        """依已選課程與登記狀態，為 `available_courses` 的每張卡片算好 `is_enrolled` 與按鈕狀態。
+
+        以集合查詢取代前端逐張卡片對已選課程列表的 `contains` 比對，
+        卡片元件只需讀取單一欄位。
+        """
+        enrolled_ids = self._enrolled_course_ids_this_year
+        for course in self.available_courses:
+            course.is_enrolled = str(course.id) in enrolled_ids
+            if course.is_enrolled:
+                course.button_text = "已選修"
+            elif self.is_registration_open:
+                course.button_text = "我要選課"
+            else:
+                course.button_text = "未開放登記"
+            # 登記未開放或已選修則禁用；非學生角色亦禁用
+            course.button_disabled = (
+                not self.is_registration_open or course.is_enrolled or not self.is_student
+            )
+        self.available_courses = list(self.available_courses) # 重新指派以通知 Reflex 列表內容已變更
 
     async def on_page_load(self):
         """選課頁面載入時執行的非同步操作。
@@ -143,8 +162,12 @@ class CourseSelectionState(AuthState):
         await self._load_current_academic_year_and_settings()
         
         if self.is_registration_open and self.current_academic_year != "未設定":
-            await self.load_available_courses() # 載入可選課程
-            await self._load_user_enrollments_for_current_year() # 載入使用者已選課程
+            # 兩者只依賴上面載入的學年度，彼此獨立，故並行查詢；
+            # 各自完成時都會重新標註課程卡片，完成順序不影響結果。
+            await asyncio.gather(
+                self.load_available_courses(), # 載入可選課程
+                self._load_user_enrollments_for_current_year(), # 載入使用者已選課程
+            )
         else:
             # 若登記未開放或學年度未設定，則清空可選課程列表
             self.available_courses = [] 
@@ -167,14 +190,18 @@ class CourseSelectionState(AuthState):
             "is_open_for_registration": True,
         }
         if self.search_term:
-            search_regex = {"$regex": self.search_term, "$options": "i"}
+            # 關鍵字以字面比對 (re.escape)，避免使用者輸入被當成正規表示式而造成昂貴的回溯。
+            # 中文科目名稱需支援任意位置比對，MongoDB 全文檢索無法斷詞，故仍使用 regex；
+            # 前兩個等值條件由 ay_open_course_code 索引縮小至當學年開放中的課程後才逐筆比對。
+            search_regex = {"$regex": re.escape(self.search_term), "$options": "i"}
             query_conditions["$or"] = [
                  {"course_name": search_regex},
                  {"course_code": search_regex},
                  {"instructor_name": search_regex}
             ]
         
-        self.available_courses = await Course.find(query_conditions).sort("course_code").to_list()
+        self.available_courses = await Course.find(query_conditions).sort("course_code").project(CourseCardView).to_list()
+        self._apply_course_card_flags()
         self.is_loading = False
 
     async def handle_search_term_change(self, term: str):
@@ -206,7 +233,7 @@ class CourseSelectionState(AuthState):
         if not self.token_is_valid or not self.current_user_google_id:
             return rx.toast.error("請先登入後再進行選課。") # type: ignore
         
-        if not self.has_student_role: # 確保是學生角色
+        if not self.is_student: # 確保是學生角色
              return rx.toast.error("只有學生才能進行選課。") # type: ignore
 
         if not self.is_registration_open:
@@ -229,27 +256,15 @@ class CourseSelectionState(AuthState):
             return rx.toast.error("此課程目前無法選修或不屬於當前學期。") # type: ignore
 
         # 獲取學生已選課程 (用於衝堂檢查)
-        valid_statuses = [EnrollmentStatus.SUCCESS, EnrollmentStatus.PENDING_CONFIRMATION]
         existing_enrollments = await Enrollment.find(
             Enrollment.user_id.id == current_user_db.id, # type: ignore
             Enrollment.academic_year == self.current_academic_year,
-            Enrollment.status.is_in(valid_statuses) # type: ignore
+            In(Enrollment.status, ACTIVE_ENROLLMENT_STATUSES), # MongoDB $in
         ).fetch_links(Enrollment.course_id).to_list() # fetch_links 以便能訪問 course_id.time_slots
 
-        enrolled_courses_details = []
-        for enroll in existing_enrollments:
-            if enroll.course_id: # enroll.course_id is a Link[Course]
-                 # Beanie 0.24+ Link.fetch() is implicit if fetch_links=True on find
-                 # but to be safe, or if it's not fetched, we can fetch it.
-                 # However, if fetch_links=True was used, enroll.course_id should be the Course object.
-                 # Let's assume it's already a Course object due to fetch_links.
-                if isinstance(enroll.course_id, Course): # Check if it's already fetched
-                    enrolled_courses_details.append(enroll.course_id)
-                else: # If not, fetch it (this path might not be needed with Beanie's fetch_links)
-                    course_doc = await enroll.course_id.fetch() # type: ignore
-                    if course_doc:
-                        enrolled_courses_details.append(course_doc)
-        
+        # fetch_links 已載入的課程直接使用，未載入者併發 fetch
+        enrolled_courses_details = await fetch_enrolled_courses(existing_enrollments)
+
         conflict_reason = check_course_conflict(selected_course, enrolled_courses_details, self.current_academic_year)
         if conflict_reason:
             return rx.toast.error(f"選課失敗：{conflict_reason}") # type: ignore
@@ -264,15 +279,31 @@ class CourseSelectionState(AuthState):
         if already_enrolled_this_exact_course and already_enrolled_this_exact_course.is_active_enrollment:
              return rx.toast.info("您已報名此課程。") # type: ignore
 
-
-        new_enrollment = Enrollment(
-            user_id=current_user_db.id, # type: ignore
-            course_id=selected_course.id, # type: ignore
-            academic_year=self.current_academic_year,
-            status=EnrollmentStatus.SUCCESS, # 預設成功，或可改為 PENDING_CONFIRMATION
-            payment_status=PaymentStatus.AWAITING_PAYMENT # 預設待繳費
-        )
-        await new_enrollment.insert()
+        if already_enrolled_this_exact_course:
+            # 先前已退選的記錄仍佔用唯一索引，改以 set_status 重新啟用 (同時保留名額)，而非插入新記錄
+            result = await Enrollment.set_status(
+                already_enrolled_this_exact_course.id, EnrollmentStatus.SUCCESS, PaymentStatus.AWAITING_PAYMENT
+            )
+            if result is StatusChangeResult.COURSE_FULL:
+                return rx.toast.error(f"課程 '{selected_course.course_name}' 已額滿。") # type: ignore
+            if result is not StatusChangeResult.CHANGED:
+                return rx.toast.info("您已報名此課程。") # type: ignore # 並發請求已先行重新啟用
+        else:
+            # 以原子 $inc 保留名額；已額滿時不寫入任何資料
+            if not await Course.reserve_seat(selected_course.id):
+                return rx.toast.error(f"課程 '{selected_course.course_name}' 已額滿。") # type: ignore
+            new_enrollment = Enrollment(
+                user_id=current_user_db.id, # type: ignore
+                course_id=selected_course.id, # type: ignore
+                academic_year=self.current_academic_year,
+                status=EnrollmentStatus.SUCCESS, # 預設成功，或可改為 PENDING_CONFIRMATION
+                payment_status=PaymentStatus.AWAITING_PAYMENT # 預設待繳費
+            )
+            try:
+                await new_enrollment.insert()
+            except DuplicateKeyError: # 並發的重複請求已先行插入，由唯一索引擋下
+                await Course.release_seat(selected_course.id)
+                return rx.toast.info("您已報名此課程。") # type: ignore
         
         await self._load_user_enrollments_for_current_year() # 更新已選課程 ID 列表
         # 可以考慮是否需要重新載入 available_courses (例如人數上限變化)
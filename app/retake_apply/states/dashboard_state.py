@@ -4,37 +4,87 @@
 負責處理應用程式儀表板頁面的所有後端邏輯。
 主要功能是根據登入使用者的角色，載入並準備對應儀表板所需的資料。
 """
+import asyncio
 import reflex as rx
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
+from beanie import Link, PydanticObjectId
+from bson.errors import InvalidId
 
 from .auth import AuthState # 基礎身份驗證狀態
-from ..models.users import User, UserGroup # 使用者模型及角色列舉
-from ..models.required_course import RequiredCourse # 應重補修科目模型
-from ..models.enrollment import Enrollment, EnrollmentStatus # 選課記錄模型及狀態列舉
+from ..models.users import User # 使用者模型
+from ..models.required_course import RequiredCourse, RequiredCourseRow # 應重補修科目模型及其列表投影
+from ..models.enrollment import Enrollment, EnrollmentCourseRow, EnrollmentDetail, fetch_enrollment_course_rows # 選課模型、列表資料列與詳情
 from ..models.academic_year_setting import AcademicYearSetting # 學年度設定模型
 
+REQUIRED_COURSES_PAGE_SIZE = 20 # 應重補修科目每次載入的筆數
+
 class DashboardState(AuthState):
     """管理儀表板頁面的狀態與相關邏輯。
 
     根據登入使用者的角色，動態載入並顯示不同的儀表板資訊。
 
     Attributes:
-        my_required_courses (rx.Var[List[RequiredCourse]]): 若使用者為學生，
-            儲存其未完成的應重補修科目列表。
-        my_enrollments (rx.Var[List[Enrollment]]): 若使用者為學生，
-            儲存其在本學期已登記的課程列表。
+        my_required_courses (rx.Var[List[RequiredCourseRow]]): 若使用者為學生，
+            儲存其未完成的應重補修科目列表 (僅含表格顯示的欄位)。
+        my_enrollments (rx.Var[List[EnrollmentCourseRow]]): 若使用者為學生，
+            儲存其在本學期已登記的課程列表 (已合併課程代碼與名稱)，僅含列表所需欄位。
+        required_has_more (rx.Var[bool]): 是否還有更早上傳的應重補修科目可供「載入更多」。
+        selected_enrollment_detail (rx.Var[Optional[EnrollmentDetail]]): 「詳情」視窗中顯示的選課詳細資訊，
+            僅在學生點擊該列時才載入。
+        show_enrollment_detail_modal (rx.Var[bool]): 控制選課詳情視窗的顯示。
         current_academic_year_display (rx.Var[str]): 顯示在儀表板上的當前學年度字串。
         is_loading_dashboard_data (rx.Var[bool]): 標記是否正在從後端載入儀表板資料。
     """
 
     # --- 學生儀表板相關狀態 ---
-    my_required_courses: List[RequiredCourse] = []
-    my_enrollments: List[Enrollment] = []
-    
+    my_required_courses: List[RequiredCourseRow] = []
+    required_has_more: bool = False
+    # 已載入的最後一筆應重補修科目之 (uploaded_at, _id)，作為下一批的 keyset 起點；僅存於後端。
+    _required_cursor: Optional[Tuple[datetime, PydanticObjectId]] = None
+    my_enrollments: List[EnrollmentCourseRow] = []
+    selected_enrollment_detail: Optional[EnrollmentDetail] = None
+    show_enrollment_detail_modal: bool = False
+    _student_user_id: Optional[PydanticObjectId] = None # 目前學生的使用者 ID，僅存於後端，供載入詳情時驗證擁有者
+
     # --- 通用顯示狀態 ---
     current_academic_year_display: str = "未設定"
     is_loading_dashboard_data: bool = False # 用於控制載入指示器的顯示
 
+    @rx.var(cache=True)
+    def primary_role(self) -> str:
+        """依角色優先順序 (系統管理者 > 課程管理者 > 學生) 決定儀表板要顯示的內容。
+
+        僅在 `role_mask` 變動時重新計算，頁面以單一 `rx.match` 依此值選擇分支。
+
+        Returns:
+            str: "admin"、"manager"、"student" 之一；無上述角色時為 "none"。
+        """
+        if self.is_system_admin:
+            return "admin"
+        if self.is_course_manager:
+            return "manager"
+        if self.is_student:
+            return "student"
+        return "none"
+
+    @rx.var(cache=True)
+    def welcome_name(self) -> str:
+        """儀表板歡迎訊息中的使用者名稱；token 中無名稱時以角色名稱代替。
+
+        Returns:
+            str: 使用者名稱或角色名稱。
+        """
+        name = self.tokeninfo.get("name") if isinstance(self.tokeninfo, dict) else None
+        if name:
+            return name
+        return "系統管理者" if self.is_system_admin else "課程管理者" if self.is_course_manager else "使用者"
+
+    @rx.var(cache=True)
+    def academic_year_banner(self) -> str:
+        """學生儀表板顯示的當前學年度文字。"""
+        return f"目前學年度: {self.current_academic_year_display}"
+
     async def _load_student_dashboard_data(self):
         """內部輔助函式，專門載入學生角色儀表板所需的資料。
 
@@ -44,34 +94,98 @@ class DashboardState(AuthState):
         if not self.token_is_valid or not self.current_user_google_id or \
            self.current_academic_year_display == "未設定":
             self.my_required_courses = []
+            self.required_has_more = False
             self.my_enrollments = []
+            self._student_user_id = None
             return
 
         current_user_db = await User.find_one(User.google_sub == self.current_user_google_id)
         if not current_user_db:
             self.my_required_courses = []
+            self.required_has_more = False
             self.my_enrollments = []
+            self._student_user_id = None
+            return
+        self._student_user_id = current_user_db.id
+
+        # 兩者互不相依，並行查詢：
+        # - 學生未完成的應重補修科目 (第一批)
+        # - 學生在本學期已登記且狀態有效的課程，課程代碼與名稱於同一次 aggregation 中合併
+        self.my_required_courses = []
+        self._required_cursor = None
+        _, self.my_enrollments = await asyncio.gather(
+            self._load_required_courses_batch(),
+            fetch_enrollment_course_rows(current_user_db.id, self.current_academic_year_display), # type: ignore[arg-type]
+        )
+
+
+    async def _load_required_courses_batch(self):
+        """載入下一批未完成的應重補修科目並附加至 `my_required_courses`。
+
+        以上一批最後一筆的 (uploaded_at, _id) 作為 keyset 起點，由複合索引
+        `user_remedied_uploaded_at__id` 直接定位，成本不隨已載入筆數增加。多取一筆用於判斷是否還有更多。
+        """
+        query_conditions = {
+            "user_id.$id": self._student_user_id,
+            "is_remedied": False,
+        }
+        if self._required_cursor:
+            last_uploaded_at, last_id = self._required_cursor
+            query_conditions["$or"] = [
+                {"uploaded_at": {"$lt": last_uploaded_at}},
+                {"uploaded_at": last_uploaded_at, "_id": {"$lt": last_id}},
+            ]
+
+        batch = await RequiredCourse.find(
+            query_conditions,
+            sort=[("uploaded_at", -1), ("_id", -1)], # _id 作為同一上傳時間記錄的穩定次序
+        ).limit(REQUIRED_COURSES_PAGE_SIZE + 1).project(RequiredCourseRow).to_list() # 僅投影表格欄位
+        self.required_has_more = len(batch) > REQUIRED_COURSES_PAGE_SIZE
+        batch = batch[:REQUIRED_COURSES_PAGE_SIZE]
+        if batch:
+            self._required_cursor = (batch[-1].uploaded_at, batch[-1].id)
+        self.my_required_courses = self.my_required_courses + batch
+
+    async def load_more_required(self):
+        """「載入更多」按鈕的事件處理器，續取下一批應重補修科目。"""
+        if not self._student_user_id or not self.required_has_more:
             return
+        await self._load_required_courses_batch()
+
+    async def load_enrollment_detail(self, enrollment_id: str):
+        """載入並顯示指定選課記錄的詳細資訊視窗。
 
-        # 載入學生未完成的應重補修科目
-        self.my_required_courses = await RequiredCourse.find(
-            RequiredCourse.user_id.id == current_user_db.id, # type: ignore[attr-defined]
-            RequiredCourse.is_remedied == False
-            # fetch_links=True # RequiredCourse 目前沒有 Link[User]，但若未來加入可啟用
-        ).sort("-uploaded_at").to_list()
-
-        # 載入學生在本學期已登記且狀態有效的課程
-        valid_enrollment_statuses = [
-            EnrollmentStatus.SUCCESS, 
-            EnrollmentStatus.PENDING_CONFIRMATION
-            # 可根據需求加入其他視為「有效」的選課狀態
-        ]
-        self.my_enrollments = await Enrollment.find(
-            Enrollment.user_id.id == current_user_db.id, # type: ignore[attr-defined]
-            Enrollment.academic_year == self.current_academic_year_display,
-            Enrollment.status.is_in(valid_enrollment_statuses) # type: ignore # Beanie is_in operator
-        ).fetch_links(True).sort("-enrolled_at").to_list() # fetch_links=True 會載入關聯的 User 和 Course
+        列表僅載入列表所需的欄位，詳細資訊 (授課教師、上課時間、費用等) 於此依 ID 取回；
+        查詢條件包含目前學生的使用者 ID，學生無法檢視他人的選課記錄。
 
+        Args:
+            enrollment_id (str): 要檢視的選課記錄 ID。
+        """
+        if not self._student_user_id or not enrollment_id:
+            return
+        try:
+            enrollment_oid = PydanticObjectId(enrollment_id)
+        except InvalidId:
+            return rx.toast.error("選課記錄 ID 格式錯誤。") # type: ignore
+
+        enrollment = await Enrollment.find_one(
+            Enrollment.id == enrollment_oid,
+            Enrollment.user_id.id == self._student_user_id, # type: ignore[attr-defined]
+        )
+        if not enrollment:
+            return rx.toast.error("找不到此選課記錄。") # type: ignore
+
+        # 僅解析課程的 Link；使用者即為目前學生，無需載入
+        course = await enrollment.course_id.fetch() if isinstance(enrollment.course_id, Link) else enrollment.course_id
+        self.selected_enrollment_detail = EnrollmentDetail.from_documents(
+            enrollment, course if not isinstance(course, Link) else None
+        )
+        self.show_enrollment_detail_modal = True
+
+    def close_enrollment_detail_modal(self):
+        """關閉選課詳情視窗並清除已載入的詳細資訊。"""
+        self.show_enrollment_detail_modal = False
+        self.selected_enrollment_detail = None
 
     async def _load_dashboard_data(self):
         """內部輔助函式，根據登入使用者的角色載入對應的儀表板資料。
@@ -80,7 +194,13 @@ class DashboardState(AuthState):
         決定是否呼叫 `_load_student_dashboard_data`。
         """
         self.is_loading_dashboard_data = True
-        
+        try:
+            await self._load_dashboard_data_unguarded()
+        finally:
+            self.is_loading_dashboard_data = False
+
+    async def _load_dashboard_data_unguarded(self):
+        """`_load_dashboard_data` 的實際載入步驟，載入指示器的開關由呼叫端負責。"""
         # 步驟 1: 載入當前學年度設定
         current_academic_setting = await AcademicYearSetting.get_current()
         if current_academic_setting:
@@ -89,15 +209,13 @@ class DashboardState(AuthState):
             self.current_academic_year_display = "未設定" # 若系統無有效學年度設定
 
         # 步驟 2: 根據使用者角色載入特定資料
-        if UserGroup.STUDENT in self.current_user_groups:
+        if self.is_student: # 由 AuthState 以 role_mask 快取的角色判斷
             await self._load_student_dashboard_data()
         
         # 備註：課程管理者和系統管理者的儀表板目前主要顯示靜態連結，
         # 若未來這些角色儀表板需要顯示動態資料 (例如統計數據)，
         # 則應在此處加入相應的資料載入邏輯。
 
-        self.is_loading_dashboard_data = False
-
     async def on_page_load(self):
         """儀表板頁面載入時執行的非同步操作。
 
@@ -112,18 +230,5 @@ class DashboardState(AuthState):
         # 此處專注於載入儀表板內容所需的資料。
         await self._load_dashboard_data()
 
-    # --- 角色檢查計算變數 ---
-    @rx.var
-    def is_system_admin(self) -> bool:
-        """檢查當前使用者是否為系統管理者。"""
-        return self.is_member_of_any([UserGroup.SYSTEM_ADMIN])
-
-    @rx.var
-    def is_course_manager(self) -> bool:
-        """檢查當前使用者是否為課程管理者。"""
-        return self.is_member_of_any([UserGroup.COURSE_MANAGER])
-
-    @rx.var
-    def is_student(self) -> bool:
-        """檢查當前使用者是否為學生。"""
-        return self.is_member_of_any([UserGroup.STUDENT])
+    # 備註：角色檢查計算變數 (is_student、is_course_manager、is_system_admin)
+    # 已由 AuthState 以快取計算變數提供，此處直接繼承使用。
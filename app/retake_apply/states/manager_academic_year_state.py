@@ -4,6 +4,7 @@
 負責處理課程管理者（及系統管理者）設定和調整系統當前運作學年度
 以及學生選課登記起迄時間的相關邏輯。
 """
+import asyncio
 import reflex as rx
 from typing import List, Optional
 import re # 用於學年度格式驗證
@@ -11,7 +12,7 @@ from datetime import datetime, timezone, timedelta # 用於日期時間處理與
 
 from .auth import AuthState # 基礎身份驗證狀態
 from ..models.users import UserGroup # 用於權限檢查
-from ..models.academic_year_setting import AcademicYearSetting # 學年度設定模型
+from ..models.academic_year_setting import AcademicYearSetting, AcademicYearRow # 學年度設定模型及歷史表格投影
 from ..utils.funcs import format_datetime_to_taipei_str # 日期時間格式化輔助函式
 
 class ManagerAcademicYearState(AuthState):
@@ -20,8 +21,8 @@ class ManagerAcademicYearState(AuthState):
     Attributes:
         current_setting_display (rx.Var[Optional[AcademicYearSetting]]): 
             儲存當前生效的 `AcademicYearSetting` 物件，用於在 UI 中顯示。
-        academic_year_history (rx.Var[List[AcademicYearSetting]]): 
-            儲存所有學年度設定的歷史記錄列表。
+        academic_year_history (rx.Var[List[AcademicYearRow]]): 
+            儲存所有學年度設定的歷史記錄列表，時間欄位已格式化為顯示字串。
         new_academic_year_input (rx.Var[str]): 
             綁定到新學年度輸入框的值。
         new_reg_start_time_input (rx.Var[str]): 
@@ -37,7 +38,7 @@ class ManagerAcademicYearState(AuthState):
     """
 
     current_setting_display: Optional[AcademicYearSetting] = None
-    academic_year_history: List[AcademicYearSetting] = []
+    academic_year_history: List[AcademicYearRow] = []
     
     # --- 新學年度設定表單相關狀態 ---
     new_academic_year_input: str = ""
@@ -106,8 +107,11 @@ class ManagerAcademicYearState(AuthState):
 
         查詢結果會更新 `current_setting_display` 和 `academic_year_history` 狀態變數。
         """
-        self.current_setting_display = await AcademicYearSetting.get_current()
-        self.academic_year_history = await AcademicYearSetting.find_all(sort=[("set_at", -1)]).to_list()
+        # 兩者互不相依，並行查詢
+        self.current_setting_display, self.academic_year_history = await asyncio.gather(
+            AcademicYearSetting.get_current(),
+            AcademicYearSetting.find_all(sort=[("set_at", -1)]).project(AcademicYearRow).to_list(), # 顯示字串於投影時一次格式化
+        )
         # console.debug(f"學年度資料已載入 - 當前: {self.current_setting_display.academic_year if self.current_setting_display else '無'}, 歷史數量: {len(self.academic_year_history)}")
 
     def _validate_academic_year_format(self, year_string: str) -> bool:
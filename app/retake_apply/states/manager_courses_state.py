@@ -5,16 +5,21 @@
 包括課程的增刪改查、CSV 匯入等。
 """
 import reflex as rx
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from beanie.odm.fields import PydanticObjectId # type: ignore # 用於將字串 ID 轉換為 ObjectId
 from pydantic import ValidationError # 用於處理 CourseTimeSlot 驗證錯誤
 
 from .auth import AuthState # 基礎身份驗證狀態
+from .pagination_state import KeysetPaginationMixin # keyset 分頁的共用狀態與翻頁事件
 from ..models.users import UserGroup # 用於權限檢查
-from ..models.course import Course, CourseTimeSlot, VALID_PERIODS # 課程模型及相關常數
+from ..models.course import Course, CourseTimeSlot, VALID_PERIODS, COURSE_EDITABLE_FIELDS # 課程模型及相關常數
 from ..models.enrollment import Enrollment # 用於檢查課程是否被選修
 from ..models.academic_year_setting import AcademicYearSetting # 用於獲取學年度選項
 from ..utils import csv_utils # CSV 處理工具
+from ..utils.funcs import get_utc_now # 使用 UTC 時間
+
+COURSE_PAGE_SIZE = 50 # 課程列表每頁筆數
+COURSE_SORT = [("academic_year", -1), ("course_code", 1)] # 排序：學年降序，科目代碼升序
 
 # 預設的空時段字典，用於初始化新增課程時的時段表單
 EMPTY_TIME_SLOT_DICT: Dict[str, Any] = {
@@ -26,11 +31,13 @@ EMPTY_TIME_SLOT_DICT: Dict[str, Any] = {
     "location": ""
 }
 
-class ManagerCoursesState(AuthState):
+class ManagerCoursesState(KeysetPaginationMixin, AuthState):
     """管理課程管理者操作課程資料的狀態與相關邏輯。
 
     Attributes:
-        courses_list (rx.Var[List[Course]]): 顯示在頁面上的課程列表。
+        courses_list (rx.Var[List[Course]]): 顯示在頁面上的課程列表 (目前頁)。
+        page (rx.Var[int]): 目前頁碼 (從 0 起算)，由 `KeysetPaginationMixin` 提供。
+        has_next_page (rx.Var[bool]): 是否還有下一頁，由 `KeysetPaginationMixin` 提供。
         search_term (rx.Var[str]): 用於篩選課程列表的搜尋關鍵字。
         filter_academic_year (rx.Var[str]): 當前用於篩選課程的學年度。
         academic_year_options (rx.Var[List[Dict[str, str]]]):
@@ -97,9 +104,18 @@ class ManagerCoursesState(AuthState):
         await self.load_courses() # 載入初始課程列表
 
     async def load_courses(self):
-        """根據 `filter_academic_year` 和 `search_term` 從資料庫載入課程列表。
+        """根據 `filter_academic_year` 和 `search_term` 從第一頁重新載入課程列表。
 
-        查詢結果按學年度降序、科目代碼升序排列，並更新 `self.courses_list`。
+        查詢結果按學年度降序、科目代碼升序排列，每頁 `COURSE_PAGE_SIZE` 筆。
+        """
+        self._reset_pagination()
+        await self._load_current_page()
+
+    def _build_query_conditions(self) -> Dict[str, Any]:
+        """依學年度篩選與搜尋關鍵字組出查詢條件 (不含分頁條件)。
+
+        Returns:
+            Dict[str, Any]: 傳給 `Course.find()` 的查詢條件。
         """
         query_conditions: Dict[str, Any] = {}
         if self.filter_academic_year:
@@ -112,9 +128,26 @@ class ManagerCoursesState(AuthState):
                 {"course_code": search_regex},
                 {"instructor_name": search_regex},
             ]
-        self.courses_list = await Course.find(query_conditions).sort(
-            [("academic_year", -1), ("course_code", 1)] # 排序：學年降序，科目代碼升序
-        ).to_list()
+        return query_conditions
+
+    def _page_end_key(self) -> Optional[Tuple[str, str]]:
+        """目前頁最後一門課程的 (academic_year, course_code)，作為下一頁的 keyset 起點。
+
+        兩者在唯一索引 academic_year_1_course_code_1 下唯一，足以作為 keyset。
+        """
+        if not self.courses_list:
+            return None
+        last_course = self.courses_list[-1]
+        return (last_course.academic_year, last_course.course_code)
+
+    async def _load_current_page(self):
+        """載入 `self.page` 所指的一頁課程，並更新 `courses_list` 與 `has_next_page`。
+
+        以上一頁最後一筆的 (academic_year, course_code) 作為 keyset 起點，翻頁不需 skip；多取一筆用於判斷是否還有下一頁。
+        """
+        query_conditions = self._keyset_query(self._build_query_conditions(), COURSE_SORT)
+        page_courses = await Course.find(query_conditions).sort(COURSE_SORT).limit(COURSE_PAGE_SIZE + 1).to_list()
+        self.courses_list = self._take_page(page_courses, COURSE_PAGE_SIZE)
 
     async def set_filter_academic_year_and_load(self, year: str):
         """設定學年度篩選條件並觸發重新載入課程列表。
@@ -385,9 +418,11 @@ class ManagerCoursesState(AuthState):
             course_to_update.is_open_for_registration = is_open
             course_to_update.time_slots = time_slots_models
 
-            await course_to_update.save() # 儲存變更
+            # 僅以 $set 寫回可編輯欄位，不以整份文件覆寫，避免蓋掉選課流程並發更新的 enrolled_count
+            course_to_update.updated_at = get_utc_now()
+            await course_to_update.set(course_to_update.model_dump(include=COURSE_EDITABLE_FIELDS))
             self.close_edit_course_modal() # 關閉編輯 Modal
-            await self.load_courses() # 重新載入課程列表
+            await self._load_current_page() # 重新載入目前頁，不跳回第一頁
             return rx.toast.success(f"課程 '{course_to_update.course_name}' 修改成功！") # type: ignore
         except ValidationError as ve:
             error_messages = [
@@ -417,7 +452,9 @@ class ManagerCoursesState(AuthState):
             course_to_delete = await Course.get(obj_id)
             if course_to_delete:
                 await course_to_delete.delete()
-                await self.load_courses() # 重新載入課程列表
+                await self._load_current_page() # 重新載入目前頁，不跳回第一頁
+                if not self.courses_list and self._page_start_keys: # 刪除的是該頁最後一筆
+                    await self.prev_page()
                 return rx.toast.info(f"課程 '{course_to_delete.course_name}' 已成功刪除。") # type: ignore
             return rx.toast.error("錯誤：找不到要刪除的課程。") # type: ignore
         except Exception as e:
@@ -1,12 +1,15 @@
+import asyncio
 import reflex as rx
 from typing import List, Optional, Dict, Any
 from beanie.odm.fields import PydanticObjectId # type: ignore
+from beanie.operators import In # MongoDB $in 查詢操作符
 from datetime import datetime
+from pymongo.errors import DuplicateKeyError # 唯一索引衝突
 
 from .auth import AuthState
 from ..models.users import User, UserGroup
 from ..models.course import Course
-from ..models.enrollment import Enrollment, EnrollmentStatus, PaymentStatus
+from ..models.enrollment import Enrollment, EnrollmentStatus, PaymentStatus, StatusChangeResult, ACTIVE_ENROLLMENT_STATUSES, fetch_enrolled_courses
 from ..models.academic_year_setting import AcademicYearSetting
 from ..utils import csv_utils # 匯入 CSV 工具模組
 from ..utils.funcs import check_course_conflict # 衝堂檢查
@@ -68,21 +71,20 @@ class ManagerEnrollmentsState(AuthState):
         
         if self.search_term:
             search_regex = {"$regex": self.search_term, "$options": "i"}
-            # 搜尋 User 的 email, student_id, fullname
-            user_matches_query = {"$or": [
-                {"email": search_regex},
-                {"student_id": search_regex},
-                {"fullname": search_regex}
-            ]}
-            matching_users = await User.find(user_matches_query).project(User.id).to_list()
-            matching_user_ids = [user.id for user in matching_users]
+            # 搜尋 User 的 email, student_id, fullname (前綴比對，可使用索引；課程仍為任意位置比對)
+            user_matches_query = User.build_search_query(self.search_term)
 
             # 搜尋 Course 的 course_name, course_code
             course_matches_query = {"$or": [
                 {"course_name": search_regex},
                 {"course_code": search_regex}
             ]}
-            matching_courses = await Course.find(course_matches_query).project(Course.id).to_list()
+            # 使用者與課程的比對互不相依，並行查詢
+            matching_users, matching_courses = await asyncio.gather(
+                User.find(user_matches_query).project(User.id).to_list(),
+                Course.find(course_matches_query).project(Course.id).to_list(),
+            )
+            matching_user_ids = [user.id for user in matching_users]
             matching_course_ids = [course.id for course in matching_courses]
 
             search_or_conditions = []
@@ -193,16 +195,11 @@ class ManagerEnrollmentsState(AuthState):
             enrolled_courses_for_student = await Enrollment.find(
                 Enrollment.user_id.id == found_user.id, # type: ignore
                 Enrollment.academic_year == current_ay_setting.academic_year,
-                Enrollment.status.is_in([EnrollmentStatus.SUCCESS, EnrollmentStatus.PENDING_CONFIRMATION]) # type: ignore
+                In(Enrollment.status, ACTIVE_ENROLLMENT_STATUSES), # MongoDB $in
             ).fetch_links().to_list() # fetch_links 以便 check_course_conflict 能訪問 course_id.time_slots
 
             # 將 Enrollment 列表中的 course_id (Link[Course]) 轉換為 Course 物件列表
-            enrolled_actual_courses = []
-            for enroll in enrolled_courses_for_student:
-                if enroll.course_id: # course_id is a Link
-                    course_obj = await enroll.course_id.fetch() # Fetch the actual Course document
-                    if course_obj:
-                        enrolled_actual_courses.append(course_obj)
+            enrolled_actual_courses = await fetch_enrolled_courses(enrolled_courses_for_student)
             
             conflict_reason = check_course_conflict(selected_course, enrolled_actual_courses, current_ay_setting.academic_year)
             if conflict_reason:
@@ -217,15 +214,31 @@ class ManagerEnrollmentsState(AuthState):
             if existing_enrollment and existing_enrollment.is_active_enrollment: # is_active_enrollment 是自定義屬性
                  return rx.toast.error(f"學生已報名過此課程 '{selected_course.course_name}'。") # type: ignore
 
-
-            new_enrollment = Enrollment(
-                user_id=found_user.id, # type: ignore
-                course_id=selected_course.id, # type: ignore
-                academic_year=current_ay_setting.academic_year,
-                status=EnrollmentStatus.SUCCESS, # 現場報名預設成功
-                # payment_status 預設為 AWAITING_PAYMENT (除非課程免費，此處未處理免費邏輯)
-            )
-            await new_enrollment.insert()
+            if existing_enrollment:
+                # 已取消的記錄仍佔用唯一索引，以 set_status 重新啟用 (同時保留名額)
+                result = await Enrollment.set_status(
+                    existing_enrollment.id, EnrollmentStatus.SUCCESS, PaymentStatus.AWAITING_PAYMENT
+                )
+                if result is StatusChangeResult.COURSE_FULL:
+                    return rx.toast.error(f"課程 '{selected_course.course_name}' 已額滿。") # type: ignore
+                if result is not StatusChangeResult.CHANGED:
+                    return rx.toast.error(f"學生已報名過此課程 '{selected_course.course_name}'。") # type: ignore
+            else:
+                # 以原子 $inc 保留名額；已額滿時不寫入任何資料
+                if not await Course.reserve_seat(selected_course.id):
+                    return rx.toast.error(f"課程 '{selected_course.course_name}' 已額滿。") # type: ignore
+                new_enrollment = Enrollment(
+                    user_id=found_user.id, # type: ignore
+                    course_id=selected_course.id, # type: ignore
+                    academic_year=current_ay_setting.academic_year,
+                    status=EnrollmentStatus.SUCCESS, # 現場報名預設成功
+                    # payment_status 預設為 AWAITING_PAYMENT (除非課程免費，此處未處理免費邏輯)
+                )
+                try:
+                    await new_enrollment.insert()
+                except DuplicateKeyError: # 並發的重複請求已先行插入
+                    await Course.release_seat(selected_course.id)
+                    return rx.toast.error(f"學生已報名過此課程 '{selected_course.course_name}'。") # type: ignore
             
             # (可選) 處理繳費單 TODO: 根據規格 5.1，初期僅規劃模型，此處不產生實際繳費單。
 
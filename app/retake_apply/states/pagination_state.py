@@ -0,0 +1,108 @@
+"""Keyset 分頁的共用狀態模組。
+
+此模組定義了 `KeysetPaginationMixin`，供列表頁面的狀態類別混入 (mixin)，
+統一處理「上一頁 / 下一頁」的頁碼、是否有下一頁，以及各頁起點的 keyset 堆疊。
+
+Keyset 分頁以上一頁最後一筆的排序鍵作為下一頁的起點，由索引直接定位，
+翻頁不需 skip 前面的記錄，成本不隨頁數增加。
+"""
+import reflex as rx
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 排序規格：(欄位名稱, 1 升序 / -1 降序)，需與查詢的 sort 一致。
+SortSpec = Sequence[Tuple[str, int]]
+
+def keyset_condition(sort: SortSpec, last_key: Sequence[Any]) -> Dict[str, Any]:
+    """建立「排序位置在 `last_key` 之後」的查詢條件。
+
+    依排序欄位逐一展開為字典序比較，例如排序為 (a 降序, b 升序) 時產生
+    `{"$or": [{"a": {"$lt": A}}, {"a": A, "b": {"$gt": B}}]}`。
+
+    Args:
+        sort (SortSpec): 查詢使用的排序規格，最後一個欄位需能唯一決定次序 (例如 `_id`)。
+        last_key (Sequence[Any]): 上一頁最後一筆記錄依 `sort` 欄位順序取出的值。
+
+    Returns:
+        Dict[str, Any]: 可與其他條件以 `$and` 合併的查詢條件。
+    """
+    branches: List[Dict[str, Any]] = []
+    for i, (field, direction) in enumerate(sort):
+        branch: Dict[str, Any] = {sort[j][0]: last_key[j] for j in range(i)}
+        branch[field] = {"$lt" if direction < 0 else "$gt": last_key[i]}
+        branches.append(branch)
+    return {"$or": branches}
+
+class KeysetPaginationMixin(rx.State, mixin=True):
+    """Keyset 分頁的共用狀態與翻頁事件。
+
+    混入的狀態類別需實作：
+    - `_load_current_page()`：以 `_keyset_query()` 組出查詢、以 `_take_page()` 截取結果，載入目前頁。
+    - `_page_end_key()`：回傳目前頁最後一筆記錄的排序鍵，目前頁為空時回傳 `None`。
+
+    Attributes:
+        page (rx.Var[int]): 目前頁碼 (從 0 起算)。
+        has_next_page (rx.Var[bool]): 是否還有下一頁。
+    """
+
+    page: int = 0
+    has_next_page: bool = False
+    # 每一頁 (第 0 頁除外) 起點的前一筆記錄之排序鍵，翻回上一頁時彈出；僅存於後端。
+    _page_start_keys: List[Tuple[Any, ...]] = []
+
+    async def _load_current_page(self):
+        """載入 `self.page` 所指的一頁資料；由混入的狀態類別實作。"""
+        raise NotImplementedError
+
+    def _page_end_key(self) -> Optional[Tuple[Any, ...]]:
+        """回傳目前頁最後一筆記錄的排序鍵；由混入的狀態類別實作。"""
+        raise NotImplementedError
+
+    def _reset_pagination(self) -> None:
+        """回到第一頁 (篩選條件變更時呼叫)，不會觸發載入。"""
+        self.page = 0
+        self._page_start_keys = []
+
+    def _keyset_query(self, query_conditions: Dict[str, Any], sort: SortSpec) -> Dict[str, Any]:
+        """在篩選條件上加上目前頁的 keyset 起點條件。
+
+        Args:
+            query_conditions (Dict[str, Any]): 不含分頁條件的查詢條件。
+            sort (SortSpec): 查詢使用的排序規格。
+
+        Returns:
+            Dict[str, Any]: 加上 keyset 條件後的查詢條件；第 0 頁時原樣回傳。
+        """
+        if not self._page_start_keys:
+            return query_conditions
+        condition = keyset_condition(sort, self._page_start_keys[-1])
+        return {"$and": [query_conditions, condition]} if query_conditions else condition
+
+    def _take_page(self, rows: List[Any], page_size: int) -> List[Any]:
+        """自多取一筆 (`limit(page_size + 1)`) 的查詢結果截出一頁，並更新 `has_next_page`。
+
+        Args:
+            rows (List[Any]): 查詢結果，最多 `page_size + 1` 筆。
+            page_size (int): 每頁筆數。
+
+        Returns:
+            List[Any]: 目前頁的記錄。
+        """
+        self.has_next_page = len(rows) > page_size
+        return rows[:page_size]
+
+    async def next_page(self):
+        """載入下一頁。"""
+        end_key = self._page_end_key()
+        if not self.has_next_page or end_key is None:
+            return
+        self._page_start_keys.append(end_key)
+        self.page += 1
+        await self._load_current_page()
+
+    async def prev_page(self):
+        """載入上一頁。"""
+        if not self._page_start_keys:
+            return
+        self._page_start_keys.pop()
+        self.page -= 1
+        await self._load_current_page()
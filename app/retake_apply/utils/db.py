@@ -5,31 +5,22 @@
 這些功能通常與應用程式的生命週期管理 (lifespan management) 結合使用。
 """
 from beanie import init_beanie
-from ..configs import DbEnv
-from ..models import (
-    User, 
-    Course, 
-    Enrollment, 
-    RequiredCourse,
-    AcademicYearSetting, # 新增
-    SystemLog,           # 新增
-    Payment              # 新增
-)
+from ..configs import get_db_env
+from ..models import DOCUMENT_MODELS # 所有需註冊的 Beanie Document 模型
 from motor.motor_asyncio import AsyncIOMotorClient
 from reflex.utils import console
 
-db_env = DbEnv()
-
 async def init_db() -> AsyncIOMotorClient:
     """初始化資料庫連線並註冊所有 Beanie 資料模型。
 
-    此函式會根據 `DbEnv` 組態設定建立一個 `AsyncIOMotorClient` 實例，
+    此函式會根據 `get_db_env()` 取得的 `DbEnv` 組態設定建立一個 `AsyncIOMotorClient` 實例，
     然後使用此客戶端初始化 Beanie，並註冊專案中定義的所有 Document 模型。
 
     Returns:
         AsyncIOMotorClient: 已建立並可用於 Beanie 初始化的 Motor 客戶端實例。
                            此實例應被傳遞給 `close_db` 以在應用程式關閉時釋放資源。
     """
+    db_env = get_db_env()
     console.info(f"正在連線至 MongoDB 資料庫: {db_env.db_name}")
     client = AsyncIOMotorClient(
         host=db_env.url,
@@ -40,15 +31,9 @@ async def init_db() -> AsyncIOMotorClient:
     )
     await init_beanie(
         database=client[db_env.db_name],
-        document_models=[
-            User,
-            Course,
-            Enrollment,
-            RequiredCourse,
-            AcademicYearSetting,
-            SystemLog,
-            Payment,
-        ]
+        document_models=list(DOCUMENT_MODELS),
+        # 不啟用 allow_index_dropping：已被取代的舊索引由 utils/migrations.py 明確刪除，
+        # 避免每次啟動時誤刪維運人員手動建立的索引。
     )
     console.info(f"已連線至 MongoDB 資料庫 {db_env.db_name} 並初始化 Beanie，已註冊模型。")
     return client
@@ -4,6 +4,7 @@
 業務邏輯判斷（例如衝堂檢查）等通用功能。
 """
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import List, Optional, TYPE_CHECKING # 匯入 TYPE_CHECKING
 # from ..models.course import Course # CourseTimeSlot 內嵌於 Course 模型檔案中 # 移除直接匯入
 # 備註：Enrollment 模型目前未在此模組直接使用。
@@ -11,6 +12,15 @@ from typing import List, Optional, TYPE_CHECKING # 匯入 TYPE_CHECKING
 if TYPE_CHECKING: # 只在型別檢查時匯入，避免執行時循環匯入
     from ..models.course import Course
 
+# 模組層級快取的時區物件，避免每次呼叫 get_utc_now() / format_datetime_to_taipei_str() 時重新查找或建立。
+_UTC = timezone.utc
+_TAIPEI_TZ = timezone(timedelta(hours=8))
+
+@lru_cache(maxsize=None)
+def _fixed_offset_tz(utc_offset: int) -> timezone:
+    """取得指定 UTC 小時偏移的 `timezone` 物件；同一偏移只建立一次。"""
+    return timezone(timedelta(hours=utc_offset))
+
 # 備註：get_now 函式提供獲取特定時區時間的功能，
 # 但在專案內部，尤其是在與資料庫時間戳互動時，
 # 強烈建議統一使用 get_utc_now() 以確保時區一致性。
@@ -23,7 +33,7 @@ def get_now(utc_offset: int = 8) -> datetime:
     Returns:
         datetime: 一個代表當前日期時間的 timezone-aware `datetime` 物件。
     """
-    return datetime.now(timezone(timedelta(hours=utc_offset)))
+    return datetime.now(_fixed_offset_tz(utc_offset))
 
 def get_utc_now() -> datetime:
     """獲取當前的 UTC 日期時間 (timezone-aware)。
@@ -31,7 +41,7 @@ def get_utc_now() -> datetime:
     Returns:
         datetime: 一個代表當前 UTC 日期時間的 timezone-aware `datetime` 物件。
     """
-    return datetime.now(timezone.utc)
+    return datetime.now(_UTC)
 
 def format_datetime_to_taipei_str(utc_dt: Optional[datetime], fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
     """將一個 UTC 的 `datetime` 物件轉換為台北時區 (UTC+8) 的格式化字串。
@@ -52,10 +62,10 @@ def format_datetime_to_taipei_str(utc_dt: Optional[datetime], fmt: str = "%Y-%m-
     
     # 由於 Reflex Var 包裝的 datetime 可能沒有 tzinfo 屬性，
     # 我們假設傳入的 utc_dt 代表 UTC 時間，但可能是 naive 的。
-    # 我們從其基本屬性重建一個 aware datetime 物件。
+    # 我們從其基本屬性重建一個 naive datetime 物件作為快取鍵，轉換時再賦予 UTC 時區。
     try:
         # 這些屬性標準 datetime 物件都有
-        aware_utc_dt = datetime(
+        naive_utc_dt = datetime(
             year=utc_dt.year,
             month=utc_dt.month,
             day=utc_dt.day,
@@ -63,16 +73,22 @@ def format_datetime_to_taipei_str(utc_dt: Optional[datetime], fmt: str = "%Y-%m-
             minute=utc_dt.minute,
             second=utc_dt.second,
             microsecond=utc_dt.microsecond,
-            tzinfo=timezone.utc  # 強制賦予 UTC 時區
         )
     except AttributeError:
         # 如果連 year, month 等基本屬性都沒有，那問題更嚴重
         # 這通常不應該發生，如果傳入的確實是 datetime 物件
         return "[日期格式錯誤]"
         
-    taipei_tz = timezone(timedelta(hours=8))
-    taipei_dt = aware_utc_dt.astimezone(taipei_tz)
-    return taipei_dt.strftime(fmt)
+    return _format_utc_as_taipei(naive_utc_dt, fmt)
+
+@lru_cache(maxsize=4096)
+def _format_utc_as_taipei(naive_utc_dt: datetime, fmt: str) -> str:
+    """將代表 UTC 的 naive `datetime` 轉為台北時間並格式化。
+
+    日誌、選課等時間戳一經寫入便不再變動，同一頁面重新渲染時會反覆格式化相同的值，
+    故以 (時間, 格式) 為鍵快取結果，省去時區轉換與 `strftime`。
+    """
+    return naive_utc_dt.replace(tzinfo=_UTC).astimezone(_TAIPEI_TZ).strftime(fmt)
 
 # check_time_slot_overlap 函式將被 CourseTimeSlot.overlaps_with 取代，故移除或註解。
 # def check_time_slot_overlap(slot1: CourseTimeSlot, slot2: CourseTimeSlot) -> bool:
@@ -124,16 +140,15 @@ def check_course_conflict(
                     f"({selected_course.course_code}) 的其他時段。")
 
         # 檢查定義一: 時間重疊 (不同課程之間)
-        # 遍歷欲選課程的每一個 time_slot
+        # 遍歷欲選課程的每一個 time_slot，以 first_overlap 找出已選課程中第一個重疊的時段
         for selected_slot in selected_course.time_slots:
-            # 遍歷當前已選課程的每一個 time_slot
-            for enrolled_slot in enrolled_course.time_slots:
-                if selected_slot.overlaps_with(enrolled_slot):
-                    return (
-                        f"課程衝突：'{selected_course.course_name}' ({selected_course.course_code}) 的時段 "
-                        f"(星期{selected_slot.day_of_week} 節次{selected_slot.period}) "
-                        f"與已選課程 '{enrolled_course.course_name}' ({enrolled_course.course_code}) 的時段 "
-                        f"(星期{enrolled_slot.day_of_week} 節次{enrolled_slot.period}) 重疊。"
-                    )
+            enrolled_slot = selected_slot.first_overlap(enrolled_course.time_slots)
+            if enrolled_slot is not None:
+                return (
+                    f"課程衝突：'{selected_course.course_name}' ({selected_course.course_code}) 的時段 "
+                    f"(星期{selected_slot.day_of_week} 節次{selected_slot.period}) "
+                    f"與已選課程 '{enrolled_course.course_name}' ({enrolled_course.course_code}) 的時段 "
+                    f"(星期{enrolled_slot.day_of_week} 節次{enrolled_slot.period}) 重疊。"
+                )
                     
     return None # 若遍歷完所有已選課程均未發現衝堂
@@ -7,6 +7,7 @@ import reflex as rx
 # from reflex.utils import console # console 未在此檔案中直接使用
 from contextlib import asynccontextmanager
 from .db import init_db, close_db # 從同目錄的 db.py 匯入資料庫處理函式
+from ..models.system_log import SystemLog # 系統日誌的背景批次寫入
 
 @asynccontextmanager
 async def lifespan(app: rx.App):
@@ -14,7 +15,8 @@ async def lifespan(app: rx.App):
 
     在應用程式啟動 (`startup`) 時，此函式會呼叫 `init_db()` 來初始化
     MongoDB 資料庫連線並設定 Beanie ODM。
-    在應用程式關閉 (`shutdown`) 時，它會確保透過 `close_db()` 關閉資料庫連線。
+    資料庫就緒後會啟動 `SystemLog` 的背景批次寫入工作。
+    在應用程式關閉 (`shutdown`) 時，會先寫入剩餘的日誌，再透過 `close_db()` 關閉資料庫連線。
 
     Args:
         app (rx.App): Reflex 應用程式實例。雖然在此函式中未直接使用 `app` 參數，
@@ -23,7 +25,9 @@ async def lifespan(app: rx.App):
     client = None # 初始化 client 變數
     try:
         client = await init_db()
+        SystemLog.start_log_writer()
         yield # 應用程式在此處運行
     finally:
         if client:
+            await SystemLog.stop_log_writer() # 在關閉連線前寫入佇列中剩餘的日誌
             await close_db(client=client)
@@ -0,0 +1,113 @@
+"""資料庫一次性遷移腳本。
+
+Beanie 只會建立模型中宣告的索引，不會刪除資料庫中多出來的索引 (`init_beanie` 未啟用
+`allow_index_dropping`，以免誤刪維運人員手動建立的索引)。索引更名、改選項，或需要回填
+既有文件的欄位時，由此腳本明確處理。
+
+部署新版本前，於應用程式容器內執行一次 (需可連線至資料庫)：
+
+    uv run python -m retake_apply.utils.migrations
+
+所有步驟皆可重複執行 (idempotent)；已完成的步驟再次執行不會有任何變更。
+"""
+import asyncio
+from typing import Awaitable, Callable, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from reflex.utils import console
+
+from ..configs import get_db_env
+from .funcs import get_utc_now
+from ..models.enrollment import ACTIVE_ENROLLMENT_STATUSES
+
+# 已被取代、不再由模型宣告的舊索引：(集合名稱, 索引名稱)。
+OBSOLETE_INDEXES: Tuple[Tuple[str, str], ...] = (
+    ("system_logs", "timestamp_-1"), # 由 TTL 索引 timestamp_1_ttl 與 keyset 分頁索引 timestamp_-1__id_-1 取代
+    ("system_logs", "level_1"), # 為 level_1_timestamp_-1__id_-1 的前綴
+    ("payments", "user_id_1_status_1"), # 以整個 DBRef 為鍵，已由 user_id.$id 開頭的複合索引取代
+    ("academic_year_settings", "is_active_1_set_at_-1"), # 已改為部分索引 is_active_1_set_at_-1_active_only
+)
+
+async def drop_obsolete_indexes(db: AsyncIOMotorDatabase) -> None:
+    """刪除 `OBSOLETE_INDEXES` 中仍存在於資料庫的舊索引。"""
+    for collection_name, index_name in OBSOLETE_INDEXES:
+        existing = await db[collection_name].index_information()
+        if index_name in existing:
+            await db[collection_name].drop_index(index_name)
+            console.info(f"已刪除舊索引 {collection_name}.{index_name}")
+
+async def backfill_course_enrolled_counts(db: AsyncIOMotorDatabase) -> None:
+    """依有效選課記錄重算每門課程的 `enrolled_count`。
+
+    `enrolled_count` 上線前的課程沒有此欄位 (預設為 0)；直接修改資料庫中的選課記錄後，
+    也可再次執行此步驟以重新同步。
+    """
+    active_statuses = [status.value for status in ACTIVE_ENROLLMENT_STATUSES]
+    pipeline = [
+        {"$match": {"status": {"$in": active_statuses}}},
+        # course_id 以 DBRef 儲存，`$id` 欄位名稱需以 $getField 取出
+        {"$group": {"_id": {"$getField": {"field": {"$literal": "$id"}, "input": "$course_id"}}, "count": {"$sum": 1}}},
+    ]
+    counts = {row["_id"]: row["count"] async for row in db["enrollments"].aggregate(pipeline)}
+    updated = 0
+    async for course in db["courses"].find({}, {"enrolled_count": 1}):
+        expected = counts.get(course["_id"], 0)
+        if course.get("enrolled_count") != expected:
+            await db["courses"].update_one({"_id": course["_id"]}, {"$set": {"enrolled_count": expected}})
+            updated += 1
+    console.info(f"已重算 {updated} 門課程的 enrolled_count")
+
+async def dedupe_active_academic_years(db: AsyncIOMotorDatabase) -> None:
+    """僅保留 `set_at` 最新的一筆作用中學年度設定，其餘改為停用。
+
+    部分唯一索引 `uniq_active` 在已有多筆作用中設定的資料庫上無法建立，
+    故此步驟須在新版本啟動 (`init_beanie` 建立索引) 之前執行。
+    """
+    collection = db["academic_year_settings"]
+    newest = await collection.find_one({"is_active": True}, {"_id": 1}, sort=[("set_at", -1)])
+    if newest is None:
+        return
+    result = await collection.update_many(
+        {"is_active": True, "_id": {"$ne": newest["_id"]}},
+        {"$set": {"is_active": False, "updated_at": get_utc_now()}},
+    )
+    if result.modified_count:
+        console.info(f"已停用 {result.modified_count} 筆重複的作用中學年度設定")
+
+async def backfill_user_fullname_lower(db: AsyncIOMotorDatabase) -> None:
+    """為缺少或未同步 `fullname_lower` 的使用者以 `fullname` 的小寫回填。"""
+    result = await db["users"].update_many(
+        {"fullname": {"$type": "string"}, "$expr": {"$ne": ["$fullname_lower", {"$toLower": "$fullname"}]}},
+        [{"$set": {"fullname_lower": {"$toLower": "$fullname"}}}],
+    )
+    if result.modified_count:
+        console.info(f"已回填 {result.modified_count} 位使用者的 fullname_lower")
+
+# 依序執行的遷移步驟；新增步驟時加在最後。
+MIGRATIONS: Tuple[Callable[[AsyncIOMotorDatabase], Awaitable[None]], ...] = (
+    drop_obsolete_indexes,
+    backfill_course_enrolled_counts,
+    dedupe_active_academic_years,
+    backfill_user_fullname_lower,
+)
+
+async def run_migrations() -> None:
+    """連線至資料庫並依序執行 `MIGRATIONS` 中的所有步驟。"""
+    db_env = get_db_env()
+    client = AsyncIOMotorClient(
+        host=db_env.url,
+        port=db_env.port,
+        username=db_env.username,
+        password=db_env.password,
+        authSource=db_env.authSource,
+    )
+    try:
+        db = client[db_env.db_name]
+        for step in MIGRATIONS:
+            console.info(f"執行遷移步驟：{step.__name__}")
+            await step(db)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_migrations())